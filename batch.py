@@ -0,0 +1,219 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed #Worker pool
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter                 #Per-job timing
+import argparse, csv, glob, json, os, sys
+
+from gps_repair.backends import RemoteElevation, open_backend #Shared 3DEP tile index or remote service
+from gps_repair.dem_index import DEMIndex
+from gps_repair.metrics import aggregate
+from gps_repair.pauses import SPORTS
+from gps_repair.repair import DEM_DIRECTORY, Repairer
+
+'''
+Repairs a whole batch of activities across a process pool.
+
+Jobs come from either a CSV manifest with the columns
+fit, route, start_bad, end_bad and optionally output, or a
+directory where every X.FIT is paired with a route X.gpx.
+With --detect, jobs without an interval (blank start_bad in
+the manifest, or every directory job) have their bad segment
+found automatically.
+'''
+
+#Added to the name of an activity for its outputs
+REPAIRED_SUFFIX = "_repaired"
+
+#Repairer built around the shared DEM index when each worker starts
+_REPAIRER = None
+
+def load_manifest(path, output_dir, detect = False):
+    '''
+    Reads jobs from a CSV manifest. Relative paths in the
+    manifest are taken relative to the manifest, output_dir
+    relative to the current directory.
+    '''
+
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, "r", newline = "") as f:
+        for row in csv.DictReader(f):
+            fit_path = os.path.join(base, row["fit"])
+            if row.get("output"):
+                output = os.path.join(base, row["output"])
+            else:
+                output = default_output(fit_path, output_dir)
+            if detect and not row.get("start_bad"):
+                interval = "auto"
+            else:
+                interval = (int(row.get("start_bad") or 0), int(row.get("end_bad") or -1))
+            jobs.append({"fit": fit_path,
+                         "route": os.path.join(base, row["route"]),
+                         "interval": interval,
+                         "output": output})
+
+    return jobs
+
+def scan_directory(path, output_dir, interval):
+    '''
+    Pairs every .fit file in a directory with the .gpx
+    route of the same name. Repaired .fit files from an earlier
+    --fit run are left out.
+    '''
+
+    jobs = []
+    for fit_path in sorted(glob.glob(os.path.join(path, "*.[Ff][Ii][Tt]"))):
+        if os.path.splitext(fit_path)[0].endswith(REPAIRED_SUFFIX):
+            continue
+        route_path = os.path.splitext(fit_path)[0] + ".gpx"
+        if not os.path.exists(route_path):
+            print("Skipping {}: no route {}".format(fit_path, route_path), file = sys.stderr)
+            continue
+
+        jobs.append({"fit": fit_path,
+                     "route": route_path,
+                     "interval": interval,
+                     "output": default_output(fit_path, output_dir)})
+
+    return jobs
+
+def default_output(fit_path, output_dir):
+    '''
+    Output .gpx path for a job without an explicit one.
+    '''
+
+    name = os.path.splitext(os.path.basename(fit_path))[0] + REPAIRED_SUFFIX + ".gpx"
+
+    return os.path.join(output_dir or os.path.dirname(fit_path), name)
+
+def _init_worker(dem, options):
+    global _REPAIRER
+    _REPAIRER = Repairer(dem, **options)
+
+def run_job(job):
+    '''
+    Repairs a single job, returning its timing, stage metrics
+    and any error instead of raising so one bad file doesn't
+    stop the batch.
+    '''
+
+    start = perf_counter()
+    metrics = None
+    try:
+        fit_output = os.path.splitext(job["output"])[0] + ".fit" if job.get("fit_output") else None
+        result = _REPAIRER.repair(job["fit"], job["route"], job["interval"], job["output"], fit_output)
+        metrics = result.metrics.report()
+        error = None
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+
+    return dict(job, seconds = perf_counter() - start, error = error, metrics = metrics)
+
+def run_batch(jobs, dem, workers = None, **options):
+    '''
+    Spreads the jobs across a ProcessPoolExecutor sharing the
+    DEM index. Extra options are passed on to each worker's
+    Repairer. Yields each result as it finishes. If a worker
+    dies (a crash in GDAL, the OOM killer) the jobs it takes
+    down with it are yielded as failed.
+    '''
+
+    #Every worker gets its own copy of a remote service, so they split its rate limit
+    if isinstance(dem, RemoteElevation):
+        dem = dem.shared(workers or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                             initargs = (dem, options)) as pool:
+        futures = dict((pool.submit(run_job, job), job) for job in jobs)
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                yield dict(futures[future], seconds = 0.0, error = "BrokenProcessPool: {}".format(e), metrics = None)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Repair a batch of activities with bad GPS segments.")
+    parser.add_argument("jobs", help = "CSV manifest or directory of X.FIT/X.gpx pairs")
+    parser.add_argument("--dem", default = DEM_DIRECTORY, help = "directory of 3DEP tiles, or an elevation service URL with {lat} and {long}")
+    parser.add_argument("--interpolation", default = "bilinear", choices = ["nearest", "bilinear", "bicubic"],
+                        help = "elevation interpolation")
+    parser.add_argument("--simplify", type = float, default = None, help = "route simplification tolerance in metres")
+    parser.add_argument("--resample", default = None,
+                        help = "seconds between fixed points, or 'record' for the activity's record interval")
+    parser.add_argument("--seed", type = int, default = None, help = "seed the noise for reproducible repairs")
+    parser.add_argument("--athlete", default = None, help = "name to keep the fitted grade/pace table under")
+    parser.add_argument("--sport", default = "running", choices = sorted(SPORTS), help = "pause and bad GPS detection thresholds")
+    parser.add_argument("--spacing", type = float, default = None, help = "maximum route point spacing in metres")
+    parser.add_argument("--cache", default = None, help = "directory to keep parsed .fit/.gpx files between runs")
+    parser.add_argument("--elevation-cache", default = None, help = "SQLite file to keep sampled elevations in between runs")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes")
+    parser.add_argument("--output-dir", default = None, help = "where to write repaired .gpx files")
+    parser.add_argument("--start-bad", type = int, default = 0, help = "start of the bad interval in seconds for directory jobs")
+    parser.add_argument("--end-bad", type = int, default = -1, help = "end of the bad interval in seconds for directory jobs")
+    parser.add_argument("--match", action = "store_true", help = "time the route from the bad GPS points snapped onto it")
+    parser.add_argument("--detect", action = "store_true", help = "find bad segments automatically")
+    parser.add_argument("--fit", action = "store_true", help = "also write each repaired activity as a .fit file")
+    parser.add_argument("--report", default = None, help = "write per-job results and stage totals to this .json file")
+    parser.add_argument("--trace-memory", action = "store_true", help = "record the peak memory of each stage")
+    parser.add_argument("--profile-stage", default = None,
+                        help = "run this stage (parse, route, fix, elevation, gpx, ...) under cProfile")
+    args = parser.parse_args(argv)
+
+    #Jobs from a manifest elsewhere still write under the current directory
+    if args.output_dir:
+        args.output_dir = os.path.abspath(args.output_dir)
+
+    if os.path.isdir(args.jobs):
+        interval = "auto" if args.detect else (args.start_bad, args.end_bad)
+        jobs = scan_directory(args.jobs, args.output_dir, interval)
+    else:
+        jobs = load_manifest(args.jobs, args.output_dir, args.detect)
+    for job in jobs:
+        job["fit_output"] = args.fit
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok = True)
+
+    #Scan the tiles once in the parent, workers inherit the extents
+    dem = open_backend(args.dem)
+    if isinstance(dem, DEMIndex):
+        dem.scan()
+
+    resample = args.resample
+    if resample not in (None, "record"):
+        resample = float(resample)
+
+    results = []
+    start = perf_counter()
+    for result in run_batch(jobs, dem, args.workers,
+                            interpolation = args.interpolation,
+                            simplify_tolerance = args.simplify,
+                            route_spacing = args.spacing,
+                            resample = resample,
+                            seed = args.seed,
+                            sport = args.sport,
+                            cache = args.cache,
+                            elevation_cache = args.elevation_cache,
+                            match_route = args.match,
+                            athlete = args.athlete,
+                            trace_memory = args.trace_memory,
+                            profile_stage = args.profile_stage):
+        results.append(result)
+        status = "ok" if result["error"] is None else "FAILED " + result["error"]
+        print("{:8.2f}s  {}  {}".format(result["seconds"], result["fit"], status))
+
+    failed = sum(1 for result in results if result["error"] is not None)
+    print("{} jobs, {} failed, {:.2f}s total".format(len(results), failed, perf_counter() - start))
+
+    #Where the time went across every successful job
+    totals = aggregate([result["metrics"] for result in results if result["metrics"] is not None])
+    for stage in totals["stages"]:
+        print("{:>12}  {:8.2f}s total  {:8.3f}s mean  {:8.3f}s max  {:>10} points".format(
+            stage["name"], stage["seconds"], stage["mean_seconds"], stage["max_seconds"], stage["points"]))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"jobs": results, "aggregate": totals}, f, indent = 2)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+from datetime import datetime, timezone       #History timestamps
+from statistics import median                 #Summary of repeated runs
+from time import perf_counter                 #Wall time
+import argparse, json, os, platform, subprocess, sys, tempfile
+
+import numpy as np
+
+from synthetic import ROOT, HillsDEM, make_case
+
+from gps_repair import Repairer
+from gps_repair.distance import cumulative_distances
+from gps_repair.fit_reader import read_fit
+from gps_repair.gpx_writer import write_gpx
+from gps_repair.route import condition_route, parse_gpx
+from gps_repair.track import Track
+
+'''
+Times each stage of a repair on synthetic activities from 1k to
+1M points and keeps a history of the results, so changes can be
+measured against a fixed baseline.
+
+    python benchmarks/pipeline.py
+    python benchmarks/pipeline.py --sizes 1000000 --runs 1 --label big
+    python benchmarks/pipeline.py --baseline before-cache
+'''
+
+SIZES = [1000, 10000, 100000]
+DATA = os.path.join(tempfile.gettempdir(), "gps_repair_benchmarks")
+HISTORY = os.path.join(ROOT, "benchmarks", "history.jsonl")
+
+#Route conditioning settings being measured
+SIMPLIFY_TOLERANCE = 2.0
+ROUTE_SPACING = 10.0
+
+def best_of(function, runs):
+    '''
+    Calls function runs times, returning the median wall time
+    in seconds and the last result.
+    '''
+
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        result = function()
+        times.append(perf_counter() - start)
+
+    return median(times), result
+
+def gdal_available():
+    try:
+        from osgeo import gdal
+    except ImportError:
+        return False
+
+    return True
+
+def bench_size(n, runs, data):
+    '''
+    Times every stage on an n point activity. Elevations come
+    from the generated DEM tile, or from HillsDEM when GDAL isn't
+    installed.
+    '''
+
+    import fitparse, gpxpy
+
+    directory = os.path.join(data, str(n))
+    interval = make_case(directory, n)
+    fit_path = os.path.join(directory, "activity.fit")
+    route_path = os.path.join(directory, "route.gpx")
+    dem_path = os.path.join(directory, "dem")
+    output = os.path.join(directory, "repaired.gpx")
+    results = {}
+
+    results["parse_fit"], records = best_of(lambda: read_fit(fitparse.FitFile(fit_path)), runs)
+
+    def load_route():
+        with open(route_path, "r") as f:
+            return parse_gpx(gpxpy.parse(f))
+    results["parse_gpx"], (route_lat, route_long) = best_of(load_route, runs)
+
+    results["condition_route"], _ = best_of(lambda: condition_route(route_lat, route_long,
+                                                                    SIMPLIFY_TOLERANCE, ROUTE_SPACING), runs)
+    results["distance"], _ = best_of(lambda: cumulative_distances(records.lat, records.long), runs)
+
+    track = Track(records.data.copy(), records.date, records.midnight)
+
+    #Without GDAL the hills are computed directly so every stage is still timed
+    dem = dem_path if gdal_available() and os.path.isdir(dem_path) else HillsDEM(n)
+    repairer = Repairer(dem, seed = 0)
+    repairer.dem.sample(records.lat[:1], records.long[:1], "bilinear")
+    results["elevation"], elevation = best_of(lambda: repairer.dem.sample(records.lat, records.long, "bilinear"), runs)
+    track.elevation[:] = elevation
+
+    #The whole repair, with the breakdown from its own stage metrics
+    results["repair"], result = best_of(lambda: repairer.repair(fit_path, route_path, interval, output), runs)
+    for stage in result.metrics.report()["stages"]:
+        results["repair." + stage["name"]] = stage["seconds"]
+
+    results["write_gpx"], _ = best_of(lambda: write_gpx(output, track), runs)
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = ROOT, capture_output = True,
+                              text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def find_baseline(history, label):
+    '''
+    The latest entry with the label, or the first entry when no
+    label is given.
+    '''
+
+    if label is None:
+        return history[0] if history else None
+    matches = [entry for entry in history if entry.get("label") == label]
+
+    return matches[-1] if matches else None
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Per-stage repair timings on synthetic activities.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES, help = "points per activity")
+    parser.add_argument("--runs", type = int, default = 3, help = "repeats per stage, the median is kept")
+    parser.add_argument("--data", default = DATA, help = "where generated inputs are kept between runs")
+    parser.add_argument("--history", default = HISTORY, help = "results history (.jsonl)")
+    parser.add_argument("--label", default = None, help = "name this run in the history")
+    parser.add_argument("--baseline", default = None, help = "label to compare against, the first run if not given")
+    parser.add_argument("--no-save", action = "store_true", help = "don't add this run to the history")
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    baseline = find_baseline(history, args.baseline)
+    if args.baseline is not None and baseline is None:
+        print("No run labelled {} in {}".format(args.baseline, args.history), file = sys.stderr)
+
+    entry = {"time": datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+             "commit": git_commit(),
+             "label": args.label,
+             "python": platform.python_version(),
+             "numpy": np.__version__,
+             "runs": args.runs,
+             "dem": "gdal" if gdal_available() else "synthetic",
+             "results": {}}
+    if baseline is not None and baseline.get("dem", "gdal") != entry["dem"]:
+        print("Baseline elevations came from {}, this run's from {}: elevation and repair stages won't compare".format(
+              baseline.get("dem", "gdal"), entry["dem"]), file = sys.stderr)
+
+    print("{:>8} {:<24} {:>10} {:>10} {:>7}".format("points", "stage", "ms", "base ms", "ratio"))
+    for n in args.sizes:
+        results = bench_size(n, args.runs, args.data)
+        entry["results"][str(n)] = results
+
+        base = (baseline or {}).get("results", {}).get(str(n), {})
+        for stage, seconds in results.items():
+            if stage in base:
+                print("{:>8} {:<24} {:>10.2f} {:>10.2f} {:>6.2f}x".format(n, stage, seconds * 1000, base[stage] * 1000,
+                                                                         seconds / base[stage] if base[stage] else float("nan")))
+            else:
+                print("{:>8} {:<24} {:>10.2f} {:>10} {:>7}".format(n, stage, seconds * 1000, "-", "-"))
+
+    if not args.no_save:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from statistics import median                 #Summary of repeated runs
+from time import perf_counter                 #Wall time
+import argparse, os, subprocess, sys
+
+'''
+Measures interpreter startup plus import time of the repair
+scripts in fresh processes, with and without the heavy
+plotting/raster dependencies that used to be imported eagerly.
+
+    python benchmarks/startup.py --runs 20
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("python", "pass"),
+    ("lazy (import single_file)", "import single_file"),
+    ("lazy (import batch)", "import batch"),
+    ("eager (old top-level imports)", "import single_file, matplotlib.pyplot\ntry:\n    from osgeo import gdal\nexcept ImportError:\n    pass"),
+]
+
+def time_import(code, runs):
+    '''
+    Runs code in a new interpreter runs times and returns the
+    wall time of each run in seconds.
+    '''
+
+    env = dict(os.environ, PYTHONPATH = ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd = ROOT, env = env, check = True)
+        times.append(perf_counter() - start)
+
+    return times
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Startup time of the repair scripts.")
+    parser.add_argument("--runs", type = int, default = 10, help = "fresh interpreters per case")
+    args = parser.parse_args(argv)
+
+    print("{:<32} {:>10} {:>10}".format("case", "median ms", "min ms"))
+    for name, code in CASES:
+        try:
+            times = time_import(code, args.runs)
+        except subprocess.CalledProcessError:
+            print("{:<32} {:>10}".format(name, "n/a"))
+            continue
+        print("{:<32} {:>10.1f} {:>10.1f}".format(name, median(times) * 1000, min(times) * 1000))
+
+if __name__ == "__main__":
+    main()
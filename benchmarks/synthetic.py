@@ -0,0 +1,203 @@
+import numpy as np                            #Vectorized track generation
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gps_repair.fit_reader import FIT_EPOCH, SEMI_TO_DEGREE
+from gps_repair.fit_writer import FitEncoder
+from gps_repair.projection import LocalProjection
+
+'''
+Synthetic inputs for the benchmarks: a planned route, a 1 Hz
+activity run along it with a stretch of bad GPS, the route of
+that stretch as gmap-pedometer would export it, and a DEM
+tile under the whole thing.
+'''
+
+#Activity shape
+ORIGIN = (40.0, -105.0)                       #lat, long of the start
+SPEED = 3.3                                   #m/s
+GPS_NOISE = 3.0                               #metres on good records
+BAD_NOISE = 60.0                              #metres on bad records
+BAD_FRACTION = (0.4, 0.6)                     #part of the activity with bad GPS
+LEG = (50.0, 400.0)                           #metres between route corners
+ROUTE_SPACING = 5.0                           #metres between exported route points
+START = 1000000000                            #unix time of the first record
+DEM_MARGIN = 0.01                             #degrees of DEM tile around the route
+
+#Message numbers used in the generated files
+FILE_ID = 0
+SESSION = 18
+LAP = 19
+RECORD = 20
+
+def planned_route(length, rng):
+    '''
+    Corners of a random walk of legs in metres east/north of
+    the origin, at least length metres long.
+    '''
+
+    legs = rng.uniform(LEG[0], LEG[1], size = int(length / LEG[0]) + 2)
+    legs = legs[:np.searchsorted(np.cumsum(legs), length) + 1]
+    heading = np.cumsum(rng.normal(0, 0.8, size = len(legs)))
+    east = np.concatenate(([0], np.cumsum(legs * np.sin(heading))))
+    north = np.concatenate(([0], np.cumsum(legs * np.cos(heading))))
+
+    return east, north
+
+def along(east, north, distance):
+    '''
+    Points at the given distances along a polyline.
+    '''
+
+    arc = np.concatenate(([0], np.cumsum(np.hypot(np.diff(east), np.diff(north)))))
+
+    return np.interp(distance, arc, east), np.interp(distance, arc, north)
+
+def make_case(directory, n, seed = 0):
+    '''
+    Writes activity.fit (n records), route.gpx and, when GDAL is
+    available, dem/tile.img into directory, reusing files already
+    there. Returns the bad interval in seconds for repair().
+    '''
+
+    rng = np.random.default_rng(seed)
+    projection = LocalProjection(*ORIGIN)
+    east, north = planned_route(n * SPEED, rng)
+    start_bad, end_bad = int(n * BAD_FRACTION[0]), int(n * BAD_FRACTION[1])
+
+    os.makedirs(directory, exist_ok = True)
+    fit_path = os.path.join(directory, "activity.fit")
+    if not os.path.exists(fit_path):
+        x, y = along(east, north, np.arange(n) * SPEED)
+        noise = np.full(n, GPS_NOISE)
+        noise[start_bad:end_bad] = BAD_NOISE
+        x += rng.normal(0, 1, size = n) * noise
+        y += rng.normal(0, 1, size = n) * noise
+        lat, long = projection.from_enu(x, y)
+        write_activity(fit_path, lat, long, START + np.arange(n))
+
+    route_path = os.path.join(directory, "route.gpx")
+    if not os.path.exists(route_path):
+        spacing = np.arange(start_bad * SPEED, end_bad * SPEED, ROUTE_SPACING)
+        lat, long = projection.from_enu(*along(east, north, spacing))
+
+        #gmap-pedometer repeats points where the route was clicked twice
+        repeat = np.where(rng.random(len(lat)) < 0.05, 2, 1)
+        write_route(route_path, np.repeat(lat, repeat), np.repeat(long, repeat))
+
+    dem_path = os.path.join(directory, "dem", "tile.img")
+    if not os.path.exists(dem_path):
+        write_dem(dem_path, *dem_bounds(n, seed))
+
+    return (start_bad, end_bad)
+
+def dem_bounds(n, seed = 0):
+    '''
+    (south, north, west, east) of the DEM tile make_case writes
+    for n records, DEM_MARGIN around the planned route.
+    '''
+
+    #The route is the first thing make_case draws
+    east, north = planned_route(n * SPEED, np.random.default_rng(seed))
+    lat, long = LocalProjection(*ORIGIN).from_enu(east, north)
+
+    return (lat.min() - DEM_MARGIN, lat.max() + DEM_MARGIN,
+            long.min() - DEM_MARGIN, long.max() + DEM_MARGIN)
+
+def write_activity(path, lat, long, stamps):
+    '''
+    Writes a minimal running activity: a file_id message, one
+    record per point with position, distance, speed and heart
+    rate, and a lap and session covering them all.
+    '''
+
+    lat_semi = np.rint(np.asarray(lat) / SEMI_TO_DEGREE).astype(np.int64).tolist()
+    long_semi = np.rint(np.asarray(long) / SEMI_TO_DEGREE).astype(np.int64).tolist()
+    stamps = (np.asarray(stamps) - FIT_EPOCH).astype(np.int64).tolist()
+    distance = np.rint(np.arange(len(stamps)) * SPEED * 100).astype(np.int64).tolist()
+    speed = int(SPEED * 1000)
+
+    with open(path, "w+b") as f:
+        encoder = FitEncoder(f)
+        encoder.write_message(FILE_ID, [(0, 0x00, 1, 4), (4, 0x86, 4, stamps[0])])
+        for i in range(len(stamps)):
+            encoder.write_message(RECORD, [(253, 0x86, 4, stamps[i]),
+                                           (0, 0x85, 4, lat_semi[i]),
+                                           (1, 0x85, 4, long_semi[i]),
+                                           (5, 0x86, 4, distance[i]),
+                                           (73, 0x86, 4, speed),
+                                           (3, 0x02, 1, 140 + i % 20)])
+        #timestamp, start_time, total_elapsed_time, total_timer_time, total_distance
+        summary = [(253, 0x86, 4, stamps[-1]), (2, 0x86, 4, stamps[0]),
+                   (7, 0x86, 4, (stamps[-1] - stamps[0]) * 1000),
+                   (8, 0x86, 4, (stamps[-1] - stamps[0]) * 1000), (9, 0x86, 4, distance[-1])]
+        encoder.write_message(LAP, summary)
+        encoder.write_message(SESSION, summary)
+        encoder.close()
+
+def write_route(path, lat, long):
+    '''
+    Writes a gmap-pedometer style .gpx: one route of bare points.
+    '''
+
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="gmap-pedometer" xmlns="http://www.topografix.com/GPX/1/1">\n<rte>\n')
+        f.writelines('<rtept lat="{:.7f}" lon="{:.7f}"></rtept>\n'.format(y, x) for y, x in zip(lat.tolist(), long.tolist()))
+        f.write('</rte>\n</gpx>\n')
+
+def hills(x, y):
+    '''
+    Rolling hills in metres, x and y in degrees east and south of
+    the tile's north-west corner.
+    '''
+
+    return 1600 + 80 * np.sin(x * 300) * np.cos(y * 250) + 20 * np.sin(x * 1700 + y * 900)
+
+class HillsDEM(object):
+    '''
+    Elevation backend computing the hills directly, standing in
+    for the DEM tile of the n record case when GDAL isn't
+    installed. The hills are anchored at the same corner as the
+    tile's, so both give the same elevations.
+    '''
+
+    name = "synthetic-hills"
+
+    def __init__(self, n, seed = 0):
+        _, self.north, self.west, _ = dem_bounds(n, seed)
+
+    def sample(self, lat, long, method = "bilinear"):
+        return hills(np.asarray(long, dtype = np.float64) - self.west, self.north - np.asarray(lat, dtype = np.float64))
+
+    def close(self):
+        pass
+
+def write_dem(path, south, north, west, east, resolution = 1 / 10800, max_size = 4096):
+    '''
+    Writes an ERDAS Imagine tile of rolling hills covering the
+    box, at 1/3 arc-second like the 3DEP tiles unless that would
+    be more than max_size pixels across. Skipped without GDAL.
+    '''
+
+    try:
+        from osgeo import gdal
+    except ImportError:
+        return
+
+    resolution = max(resolution, (north - south) / max_size, (east - west) / max_size)
+    rows = int(np.ceil((north - south) / resolution))
+    cols = int(np.ceil((east - west) / resolution))
+    y = (np.arange(rows, dtype = np.float32) * resolution)[:, None]
+    x = (np.arange(cols, dtype = np.float32) * resolution)[None, :]
+    elevation = hills(x, y)
+
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    dataset = gdal.GetDriverByName("HFA").Create(path, cols, rows, 1, gdal.GDT_Float32)
+    dataset.SetGeoTransform((west, resolution, 0, north, 0, -resolution))
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(-3.4028234663852886e+38)
+    band.WriteArray(elevation)
+    dataset = None
@@ -0,0 +1,5 @@
+'''
+Shared helpers for repairing damaged GPS segments of an activity.
+'''
+
+from .repair import Repairer, RepairResult, repair
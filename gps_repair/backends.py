@@ -0,0 +1,203 @@
+from concurrent.futures import ThreadPoolExecutor #Blocking HTTP off the event loop
+from urllib.parse import urlsplit
+import numpy as np                            #Point deduplication
+import asyncio, http.client, json
+
+from .dem_index import DEMIndex
+
+'''
+Elevation backends. Anything with a name, a
+sample(lat, long, method) returning elevations in metres (NaN
+where it has no data) and a close() can be used, on its own or
+behind a CachedElevation: DEMIndex for local 3DEP tiles and
+RemoteElevation for a point query service.
+'''
+
+#USGS Elevation Point Query Service
+EPQS_URL = "https://epqs.nationalmap.gov/v1/json?x={long}&y={lat}&units=Meters&wkid=4326&includeDate=False"
+EPQS_NODATA = -1000000
+CONCURRENCY = 8                               #requests in flight
+RATE = 10.0                                   #requests per second
+TIMEOUT = 30                                  #seconds
+RETRIES = 3
+BACKOFF = 1.0                                 #seconds, doubled after each retry
+
+def open_backend(location):
+    '''
+    Returns a RemoteElevation for an http(s) URL template and a
+    DEMIndex for anything else, taken as a directory of tiles.
+    '''
+
+    if location.startswith(("http://", "https://")):
+        return RemoteElevation(location)
+
+    return DEMIndex(location)
+
+class _RateLimit(object):
+    '''
+    Spaces request starts at least 1 / rate seconds apart. Times
+    come from the monotonic clock behind every event loop, so
+    one limit carries over from one loop to the next.
+    '''
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next = 0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next)
+        self.next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+class RemoteElevation(object):
+    '''
+    Queries an HTTP point elevation service, EPQS by default.
+    url is a template with {lat} and {long} placeholders whose
+    JSON response has the elevation under "value". Requests run
+    concurrently on a pool of keep-alive connections, at most
+    rate per second across every sample() call, and each
+    distinct point is fetched once. The rate holds within one
+    process; shared() splits it between worker processes. The
+    service does its own interpolation, so method is ignored.
+    '''
+
+    def __init__(self, url = EPQS_URL, concurrency = CONCURRENCY, rate = RATE,
+                 timeout = TIMEOUT, retries = RETRIES):
+        self.url = url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+
+        parts = urlsplit(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.netloc
+        self._path = parts.path + ("?" + parts.query if parts.query else "")
+        self._connections = []
+        self._limit = _RateLimit(rate)
+
+    @property
+    def name(self):
+        return "remote:" + self.url
+
+    def __getstate__(self):
+        #Open sockets stay with the process that made them
+        state = self.__dict__.copy()
+        state["_connections"] = []
+
+        return state
+
+    def shared(self, processes):
+        '''
+        A copy for each of processes worker processes, each
+        allowed an equal part of the rate.
+        '''
+
+        rate = self.rate / processes if self.rate else self.rate
+
+        return RemoteElevation(self.url, self.concurrency, rate, self.timeout, self.retries)
+
+    def _connect(self):
+        connection = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+
+        return connection(self._host, timeout = self.timeout)
+
+    def _get(self, connection, path):
+        '''
+        Makes one blocking request, returning the status and body.
+        '''
+
+        try:
+            connection.request("GET", path, headers = {"Accept": "application/json"})
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            #The connection reopens itself on the next request
+            connection.close()
+            raise
+
+    async def _fetch(self, pool, limit, executor, lat, long):
+        path = self._path.format(lat = "{:.8f}".format(lat), long = "{:.8f}".format(long))
+        loop = asyncio.get_running_loop()
+        delay = BACKOFF
+
+        for attempt in range(self.retries + 1):
+            await limit.wait()
+            connection = await pool.get()
+            try:
+                status, body = await loop.run_in_executor(executor, self._get, connection, path)
+            except (OSError, http.client.HTTPException):
+                status = None
+            finally:
+                pool.put_nowait(connection)
+
+            if status == 200:
+                try:
+                    value = float(json.loads(body)["value"])
+                except (ValueError, KeyError, TypeError):
+                    return np.nan
+                return np.nan if value <= EPQS_NODATA else value
+
+            #Retry throttling, server errors and dropped connections
+            if status is not None and status != 429 and status < 500:
+                return np.nan
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        return np.nan
+
+    async def _fetch_all(self, lat, long):
+        while len(self._connections) < self.concurrency:
+            self._connections.append(self._connect())
+
+        pool = asyncio.Queue()
+        for connection in self._connections:
+            pool.put_nowait(connection)
+
+        with ThreadPoolExecutor(max_workers = self.concurrency) as executor:
+            return await asyncio.gather(*(self._fetch(pool, self._limit, executor, y, x)
+                                          for y, x in zip(lat.tolist(), long.tolist())))
+
+    def sample(self, lat, long, method = "nearest"):
+        '''
+        Queries the elevation at each lat/long point. Points the
+        service has no value for, or that keep failing, are NaN.
+        Called from inside a running event loop, the queries run
+        in a loop on a thread of their own; await sample_async
+        instead to keep the caller's loop free meanwhile.
+        '''
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.sample_async(lat, long, method))
+
+        with ThreadPoolExecutor(max_workers = 1) as executor:
+            return executor.submit(asyncio.run, self.sample_async(lat, long, method)).result()
+
+    async def sample_async(self, lat, long, method = "nearest"):
+        '''
+        sample() as a coroutine, for callers with an event loop.
+        '''
+
+        lat = np.asarray(lat, dtype = np.float64)
+        long = np.asarray(long, dtype = np.float64)
+        if not lat.size:
+            return np.full(lat.shape, np.nan)
+
+        points, inverse = np.unique(np.column_stack((lat.ravel(), long.ravel())), axis = 0, return_inverse = True)
+        values = np.array(await self._fetch_all(points[:, 0], points[:, 1]), dtype = np.float64)
+
+        return values[inverse.ravel()].reshape(lat.shape)
+
+    def close(self):
+        '''
+        Closes every pooled connection.
+        '''
+
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
@@ -0,0 +1,125 @@
+import numpy as np                            #Columns stored as .npy
+import hashlib, json, os, shutil, tempfile
+
+from .fit_reader import FitRecords, read_fit
+from .route import parse_gpx
+
+'''
+On-disk cache of parsed activities and routes, so re-running
+the same inputs skips fitparse and gpxpy entirely.
+'''
+
+#Bump when the stored columns change so old entries are ignored
+VERSION = 2
+HASH_CHUNK = 1 << 20
+
+FIT_COLUMNS = ("data", "anom_time")
+GPX_COLUMNS = ("lat", "long")
+
+class ParseCache(object):
+    '''
+    Stores each parsed file as a directory of .npy columns named
+    after a hash of the file's contents, so an edited file simply
+    misses and gets parsed again. Activities keep their whole
+    track as one structured array. Columns are memory mapped on
+    reload and are read-only.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._hashes = {}
+
+    def key(self, path, kind):
+        '''
+        Hash of the contents of path. Hashes are remembered for as
+        long as the file's size and modification time don't change.
+        '''
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256("{}:{}:".format(kind, VERSION).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        key = kind + "-" + digest.hexdigest()
+        self._hashes[path] = (signature, key)
+
+        return key
+
+    def _load(self, key, columns):
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, "meta.json"), "r") as f:
+                meta = json.load(f)
+            arrays = [np.load(os.path.join(entry, name + ".npy"), mmap_mode = "r") for name in columns]
+        except (OSError, ValueError):
+            return None
+
+        return arrays, meta
+
+    def _store(self, key, columns, arrays, meta):
+        '''
+        Writes an entry into a scratch directory first and moves it
+        into place, so readers never see a half written entry.
+        '''
+
+        os.makedirs(self.directory, exist_ok = True)
+        scratch = tempfile.mkdtemp(dir = self.directory, prefix = ".tmp-")
+        try:
+            for name, column in zip(columns, arrays):
+                np.save(os.path.join(scratch, name + ".npy"), np.ascontiguousarray(column))
+            with open(os.path.join(scratch, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.rename(scratch, os.path.join(self.directory, key))
+        except OSError:
+            #Another process stored the same entry first
+            shutil.rmtree(scratch, ignore_errors = True)
+
+    def load_fit(self, path):
+        '''
+        Returns the FitRecords of the .fit file at path.
+        '''
+
+        import fitparse
+
+        key = self.key(path, "fit")
+        cached = self._load(key, FIT_COLUMNS)
+        if cached is not None:
+            arrays, meta = cached
+            return FitRecords(*arrays, meta["date"], meta["midnight"])
+
+        records = read_fit(fitparse.FitFile(path))
+        self._store(key, FIT_COLUMNS, [getattr(records, name) for name in FIT_COLUMNS],
+                    {"date": records.date, "midnight": records.midnight})
+
+        return records
+
+    def load_gpx(self, path):
+        '''
+        Returns the route lat, long of the .gpx file at path.
+        '''
+
+        import gpxpy
+
+        key = self.key(path, "gpx")
+        cached = self._load(key, GPX_COLUMNS)
+        if cached is not None:
+            return tuple(cached[0])
+
+        with open(path, "r") as f:
+            lat, long = parse_gpx(gpxpy.parse(f))
+        self._store(key, GPX_COLUMNS, (lat, long), {})
+
+        return lat, long
+
+    def clear(self):
+        '''
+        Deletes every cached entry.
+        '''
+
+        shutil.rmtree(self.directory, ignore_errors = True)
@@ -0,0 +1,181 @@
+from collections import OrderedDict           #LRU cache of open rasters
+import numpy as np                            #Vectorized tile lookup
+import os
+
+from .elevation import ElevationSampler
+
+'''
+Index of a local directory of 3DEP tiles.
+'''
+
+class DEMIndex(object):
+    '''
+    Scans a directory of 3DEP tiles once and records their
+    extents so each route can look up the tiles its points
+    fall in. Open samplers are kept in a bounded LRU cache.
+    The scan is deferred until a tile is first needed.
+    '''
+
+    def __init__(self, directory, cache_size = 8, extension = ".img"):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.extension = extension
+        self._cache = OrderedDict()
+        self.paths = None
+        self.bounds = None
+        self._grid = None
+
+    def scan(self):
+        '''
+        Walks the directory and records the [west, east, south, north]
+        extent of every tile found.
+        '''
+
+        from osgeo import gdal
+
+        paths = []
+        bounds = []
+        grid = None
+        for root, _, files in os.walk(self.directory):
+            for name in sorted(files):
+                if not name.lower().endswith(self.extension):
+                    continue
+
+                path = os.path.join(root, name)
+                dataset = gdal.Open(path, gdal.GA_ReadOnly)
+                if dataset is None:
+                    continue
+
+                x0, dx, _, y0, _, dy = dataset.GetGeoTransform()
+                x1 = x0 + dx * dataset.RasterXSize
+                y1 = y0 + dy * dataset.RasterYSize
+                dataset = None
+
+                #Pixel centre of the first tile, 3DEP tiles all share its grid
+                if grid is None:
+                    grid = (y0 + dy / 2, x0 + dx / 2, abs(dy), abs(dx))
+
+                paths.append(path)
+                bounds.append([min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1)])
+
+        self.paths = paths
+        self.bounds = np.array(bounds, dtype = np.float64).reshape(-1, 4)
+        self._grid = grid
+
+    @property
+    def name(self):
+        '''
+        Identifies the tiles to an ElevationCache.
+        '''
+
+        return "dem:" + os.path.abspath(self.directory)
+
+    @property
+    def grid(self):
+        '''
+        The pixel grid of the tiles as (lat, long) of one pixel
+        centre and the pixel height and width in degrees, or None
+        without tiles.
+        '''
+
+        self._ensure_scanned()
+
+        return self._grid
+
+    def _ensure_scanned(self):
+        if self.paths is None:
+            self.scan()
+
+    def __len__(self):
+        self._ensure_scanned()
+
+        return len(self.paths)
+
+    def __getstate__(self):
+        #GDAL handles can't be pickled, so worker processes get the extents and reopen tiles themselves
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+
+        return state
+
+    def tiles_for(self, lat, long):
+        '''
+        Returns the paths of the tiles containing at least one
+        of the lat/long points.
+        '''
+
+        lat = np.asarray(lat, dtype = np.float64)
+        long = np.asarray(long, dtype = np.float64)
+
+        return [self.paths[i] for i in self._tile_indices(lat, long)]
+
+    def _tile_indices(self, lat, long):
+        self._ensure_scanned()
+        if not len(self.paths) or not lat.size:
+            return []
+
+        #Skip tiles that don't overlap the route's bounding box before checking points
+        west, east, south, north = self.bounds.T
+        overlap = ((west <= np.nanmax(long)) & (east >= np.nanmin(long))
+                   & (south <= np.nanmax(lat)) & (north >= np.nanmin(lat)))
+
+        indices = []
+        for i in np.flatnonzero(overlap):
+            if self._contains(i, lat, long).any():
+                indices.append(i)
+
+        return indices
+
+    def _contains(self, i, lat, long):
+        west, east, south, north = self.bounds[i]
+
+        return (long >= west) & (long < east) & (lat > south) & (lat <= north)
+
+    def open(self, path):
+        '''
+        Returns an ElevationSampler for the tile, reusing
+        recently opened ones.
+        '''
+
+        sampler = self._cache.get(path)
+        if sampler is not None:
+            self._cache.move_to_end(path)
+            return sampler
+
+        sampler = ElevationSampler(path)
+        self._cache[path] = sampler
+
+        #Evict the least recently used tile
+        while len(self._cache) > self.cache_size:
+            _, old = self._cache.popitem(last = False)
+            old.close()
+
+        return sampler
+
+    def sample(self, lat, long, method = "nearest"):
+        '''
+        Calculates the elevation at each lat/long point using
+        whichever tile it falls in, interpolated with the given
+        method. Points not covered by any tile are NaN.
+        '''
+
+        lat = np.asarray(lat, dtype = np.float64)
+        long = np.asarray(long, dtype = np.float64)
+        elevation = np.full(lat.shape, np.nan)
+
+        for i in self._tile_indices(lat, long):
+            #Points on a shared edge go to the first tile with data for them
+            todo = self._contains(i, lat, long) & np.isnan(elevation)
+            if todo.any():
+                elevation[todo] = self.open(self.paths[i]).sample(lat[todo], long[todo], method)
+
+        return elevation
+
+    def close(self):
+        '''
+        Closes every cached tile.
+        '''
+
+        while self._cache:
+            _, sampler = self._cache.popitem()
+            sampler.close()
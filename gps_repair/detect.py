@@ -0,0 +1,175 @@
+import numpy as np                            #Vectorized anomaly scan
+
+from .distance import haversine, TO_RADIANS
+
+'''
+Automatic detection of bad GPS segments in a record stream.
+'''
+
+#Defaults tuned for running with a 1 Hz watch, pauses.SPORTS has max_speed for the others
+MAX_SPEED = 12.0                              #m/s, faster than any runner
+SPEED_RATIO = 3.0                             #GPS vs watch speed disagreement
+SPEED_TOLERANCE = 2.0                         #m/s, ignore disagreement below this
+SPEED_WINDOW = 5                              #records implied speed is measured over
+MAX_HEADING_CHANGE = 120.0                    #degrees between the chords before and after a record
+HEADING_WINDOW = 5                            #records each heading chord spans
+MIN_HEADING_DISTANCE = 10.0                   #metres, shorter chords are GPS noise and give no heading
+WINDOW = 15                                   #records in the smoothing window
+BAD_FRACTION = 0.3                            #fraction of flagged records in a window
+MIN_DURATION = 30                             #seconds, shorter runs are ignored
+MERGE_GAP = 20                                #seconds, closer bad runs are joined
+
+def implied_speed(lat, long, time, window = 1):
+    '''
+    Speed in m/s implied by the GPS positions and timestamps,
+    measured at each record after the first over the chord from
+    window records before it (or the first record). Chords
+    without elapsed time are NaN.
+    '''
+
+    lat = np.asarray(lat, dtype = np.float64)
+    long = np.asarray(long, dtype = np.float64)
+    time = np.asarray(time, dtype = np.float64)
+    start = np.maximum(np.arange(1, len(time)) - window, 0)
+
+    dt = time[1:] - time[start]
+    distances = haversine(lat[start], long[start], lat[1:], long[1:])
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return np.where(dt > 0, distances / dt, np.nan)
+
+def heading_changes(lat, long, window = HEADING_WINDOW):
+    '''
+    Absolute change in heading in degrees, in [0, 180], at each
+    record between the chord from window records before it and
+    the chord to window records after it, along with the length
+    of the shorter chord in metres. Returns arrays for records
+    window to n - window. Measuring over several records keeps
+    the jitter of 1 Hz positions from looking like turns.
+    '''
+
+    lat = np.asarray(lat, dtype = np.float64)
+    long = np.asarray(long, dtype = np.float64)
+    lat_r = lat * TO_RADIANS
+    long_r = long * TO_RADIANS
+
+    #Initial bearing of each chord from record i to record i + window
+    del_lamb = long_r[window:] - long_r[:-window]
+    y = np.sin(del_lamb) * np.cos(lat_r[window:])
+    x = np.cos(lat_r[:-window]) * np.sin(lat_r[window:]) - np.sin(lat_r[:-window]) * np.cos(lat_r[window:]) * np.cos(del_lamb)
+    bearing = np.degrees(np.arctan2(y, x))
+    length = haversine(lat[:-window], long[:-window], lat[window:], long[window:])
+
+    change = np.abs(bearing[window:] - bearing[:-window]) % 360
+
+    return np.minimum(change, 360 - change), np.minimum(length[window:], length[:-window])
+
+def flag_records(lat, long, time, vel, max_speed = MAX_SPEED):
+    '''
+    Flags every record whose GPS looks wrong: implied speed over
+    max_speed, implied speed disagreeing with the watch's own
+    speed, or sharp back-and-forth heading jumps measured over
+    HEADING_WINDOW records.
+    '''
+
+    n = len(time)
+    flags = np.zeros(n, dtype = bool)
+    if n < 3:
+        return flags
+
+    #Over a few records, so position jitter doesn't read as speed
+    speed = implied_speed(lat, long, time, SPEED_WINDOW)
+    vel = np.asarray(vel, dtype = np.float64)[1:]
+
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        too_fast = speed > max_speed
+        ratio = np.maximum(speed / vel, vel / speed)
+        disagree = (np.abs(speed - vel) > SPEED_TOLERANCE) & (ratio > SPEED_RATIO)
+
+    #Jumps only count when the watch thinks it's moving and the chords are long enough to have a heading
+    moving = np.nan_to_num(vel) > SPEED_TOLERANCE
+    jumps = np.zeros(n - 1, dtype = bool)
+    if n > 2 * HEADING_WINDOW:
+        change, length = heading_changes(lat, long)
+        inner = slice(HEADING_WINDOW - 1, n - HEADING_WINDOW - 1)
+        jumps[inner] = (change > MAX_HEADING_CHANGE) & (length >= MIN_HEADING_DISTANCE) & moving[inner]
+
+    #Segment flags mark the record they end on
+    flags[1:] = too_fast | disagree | jumps
+
+    return flags
+
+def runs(mask):
+    '''
+    Run-length encodes a boolean mask into (start, end) index
+    pairs of its True runs, end exclusive.
+    '''
+
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def detect_bad_intervals(records, max_speed = MAX_SPEED):
+    '''
+    Proposes the bad GPS intervals of a FitRecords as a list of
+    (start, end) in seconds from the start of the activity, in
+    the same form as a hand-entered bad interval: 0 for the
+    start of the file and -1 for the end. max_speed is the
+    fastest the sport can go, from pauses.SPORTS.
+    '''
+
+    time = records.time
+    n = len(time)
+    if n < 3:
+        return []
+
+    flags = flag_records(records.lat, records.long, time, records.vel, max_speed)
+
+    #Smooth so isolated glitches don't count but sustained bad stretches do
+    kernel = np.ones(WINDOW) / WINDOW
+    bad = np.convolve(flags.astype(np.float64), kernel, mode = "same") >= BAD_FRACTION
+
+    #Join runs separated by short gaps, then drop short runs
+    intervals = []
+    for start, end in runs(bad):
+        if intervals and time[start] - time[intervals[-1][1] - 1] <= MERGE_GAP:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+
+    proposed = []
+    for start, end in intervals:
+        if time[end - 1] - time[start] < MIN_DURATION:
+            continue
+
+        start_s = 0 if start == 0 else int(time[start] - time[0])
+        end_s = -1 if end == n else int(time[end] - time[0])
+        proposed.append((start_s, end_s))
+
+    return proposed
+
+def interval_offsets(time, bad_interval):
+    '''
+    Maps a bad interval in seconds from the start of the activity
+    to record indices (start, end), end exclusive, with a binary
+    search over the sorted timestamps. Seconds missing from the
+    record stream resolve to the next record. Raises ValueError
+    when the interval holds no records.
+    '''
+
+    time = np.asarray(time, dtype = np.float64)
+    start, end = bad_interval
+
+    if start != 0:
+        start = max(int(np.searchsorted(time, time[0] + start, side = "left")) - 1, 0)
+    if end == -1:
+        end = len(time)
+    else:
+        end = int(np.searchsorted(time, time[0] + end, side = "left"))
+
+    if start >= end:
+        raise ValueError("Bad interval {} ends before it starts".format(tuple(bad_interval)))
+
+    return start, end
@@ -0,0 +1,52 @@
+import numpy as np                            #Vectorized haversine
+
+'''
+Batched haversine distances over whole lat/long arrays.
+'''
+
+#Constants
+R = 6371E3
+TO_RADIANS = np.pi / 180
+
+def haversine(lat1, long1, lat2, long2):
+    '''
+    Calculates the distance in metres between each pair of
+    long/lat points using the Haversine formula. Accepts
+    scalars or arrays of matching shape.
+    '''
+
+    #Formula variables
+    psi1 = np.asarray(lat1, dtype = np.float64) * TO_RADIANS
+    psi2 = np.asarray(lat2, dtype = np.float64) * TO_RADIANS
+    del_psi = psi2 - psi1
+    del_lamb = (np.asarray(long2, dtype = np.float64) - np.asarray(long1, dtype = np.float64)) * TO_RADIANS
+
+    a = np.sin(del_psi / 2)**2 + np.cos(psi1) * np.cos(psi2) * np.sin(del_lamb / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R * c
+
+def segment_distances(lat, long):
+    '''
+    Calculates the distance in metres of every segment of
+    a track in one pass. Returns an array one shorter than
+    the track.
+    '''
+
+    lat = np.asarray(lat, dtype = np.float64)
+    long = np.asarray(long, dtype = np.float64)
+
+    return haversine(lat[:-1], long[:-1], lat[1:], long[1:])
+
+def cumulative_distances(lat, long):
+    '''
+    Calculates the distance in metres travelled from the start
+    of a track to each of its points. The first entry is 0.
+    '''
+
+    segments = segment_distances(lat, long)
+    cumulative = np.empty(len(segments) + 1)
+    cumulative[0] = 0
+    np.cumsum(segments, out = cumulative[1:])
+
+    return cumulative
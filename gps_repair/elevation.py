@@ -0,0 +1,216 @@
+import numpy as np                            #Vectorized sampling
+
+'''
+Elevation lookups against 3DEP rasters downloaded from
+https://www.usgs.gov/core-science-systems/ngp/3dep
+'''
+
+#Supported interpolation modes and the pixel padding each one needs
+INTERPOLATION = {"nearest": 0, "bilinear": 1, "bicubic": 2}
+
+#Keys cubic convolution parameter
+CUBIC_A = -0.5
+
+def _gather(arr, r, c):
+    '''
+    Looks up arr[r, c] for integer index arrays, clamping
+    indices that fall off the edge of the window.
+    '''
+
+    r = np.clip(r, 0, arr.shape[0] - 1)
+    c = np.clip(c, 0, arr.shape[1] - 1)
+
+    return arr[r, c]
+
+def _nearest(arr, rows, cols):
+    '''
+    Value of the pixel containing each point.
+    '''
+
+    return _gather(arr, np.floor(rows).astype(np.intp), np.floor(cols).astype(np.intp))
+
+def _bilinear(arr, rows, cols):
+    '''
+    Bilinear interpolation between the four pixel centres
+    surrounding each point.
+    '''
+
+    #Pixel centres sit at half integer coordinates
+    rows = rows - 0.5
+    cols = cols - 0.5
+    r0 = np.floor(rows).astype(np.intp)
+    c0 = np.floor(cols).astype(np.intp)
+    t = rows - r0
+    u = cols - c0
+
+    top = _gather(arr, r0, c0) * (1 - u) + _gather(arr, r0, c0 + 1) * u
+    bottom = _gather(arr, r0 + 1, c0) * (1 - u) + _gather(arr, r0 + 1, c0 + 1) * u
+
+    return top * (1 - t) + bottom * t
+
+def _cubic_weights(t):
+    '''
+    Keys cubic convolution weights for the four samples at
+    offsets -1, 0, 1, 2 from the point.
+    '''
+
+    a = CUBIC_A
+    s = t + 1
+    w0 = ((a * s - 5 * a) * s + 8 * a) * s - 4 * a
+    w1 = ((a + 2) * t - (a + 3)) * t * t + 1
+    s = 1 - t
+    w2 = ((a + 2) * s - (a + 3)) * s * s + 1
+    w3 = 1 - w0 - w1 - w2
+
+    return w0, w1, w2, w3
+
+def _bicubic(arr, rows, cols):
+    '''
+    Bicubic interpolation over the 4x4 pixel centres
+    surrounding each point.
+    '''
+
+    rows = rows - 0.5
+    cols = cols - 0.5
+    r0 = np.floor(rows).astype(np.intp)
+    c0 = np.floor(cols).astype(np.intp)
+    row_weights = _cubic_weights(rows - r0)
+    col_weights = _cubic_weights(cols - c0)
+
+    result = np.zeros(rows.shape)
+    for i, wr in enumerate(row_weights):
+        line = np.zeros(rows.shape)
+        for j, wc in enumerate(col_weights):
+            line += _gather(arr, r0 + i - 1, c0 + j - 1) * wc
+        result += line * wr
+
+    return result
+
+class ElevationSampler(object):
+    '''
+    Samples elevation from a single full resolution 3DEP
+    raster (.img). The raster is opened once and only the
+    pixel window covering the requested points is read.
+    '''
+
+    def __init__(self, path):
+        #GDAL is only loaded once a raster is actually needed
+        from osgeo import gdal
+
+        self.path = path
+        self.dataset = gdal.Open(path, gdal.GA_ReadOnly)
+        if self.dataset is None:
+            raise IOError("Could not open elevation raster {}".format(path))
+
+        self.band = self.dataset.GetRasterBand(1)
+        self.nodata = self.band.GetNoDataValue()
+        self.ncols = self.dataset.RasterXSize
+        self.nrows = self.dataset.RasterYSize
+        self.x0, self.dx, _, self.y0, _, self.dy = self.dataset.GetGeoTransform()
+
+        #Memory map the band when the driver allows it, otherwise fall back to windowed reads
+        try:
+            self.mapped = self.band.GetVirtualMemAutoArray(gdal.GF_Read)
+        except (AttributeError, RuntimeError):
+            self.mapped = None
+
+    @property
+    def extent(self):
+        '''
+        Bounds of the raster as [west, east, south, north].
+        '''
+
+        return [self.x0,
+                self.x0 + self.dx * self.ncols,
+                self.y0 + self.dy * self.nrows,
+                self.y0]
+
+    def pixels(self, lat, long):
+        '''
+        Converts lat/long arrays to fractional pixel coordinates
+        (row, column) of the raster.
+        '''
+
+        rows = (np.asarray(lat, dtype = np.float64) - self.y0) / self.dy
+        cols = (np.asarray(long, dtype = np.float64) - self.x0) / self.dx
+
+        return rows, cols
+
+    def read_window(self, row0, col0, nrows, ncols):
+        '''
+        Reads a block of the raster as float64 with nodata
+        replaced by NaN.
+        '''
+
+        if self.mapped is not None:
+            window = np.array(self.mapped[row0:row0 + nrows, col0:col0 + ncols], dtype = np.float64)
+        else:
+            window = self.band.ReadAsArray(int(col0), int(row0), int(ncols), int(nrows)).astype(np.float64)
+
+        if self.nodata is not None:
+            window[window == self.nodata] = np.nan
+
+        return window
+
+    def bounding_window(self, rows, cols, pad = 0):
+        '''
+        Returns the (row0, col0, nrows, ncols) window covering the
+        given pixel coordinates, padded and clipped to the raster.
+        Returns None if no coordinate lands on the raster.
+        '''
+
+        inside = (rows >= 0) & (rows < self.nrows) & (cols >= 0) & (cols < self.ncols)
+        if not inside.any():
+            return None
+
+        row0 = max(int(np.floor(rows[inside].min())) - pad, 0)
+        col0 = max(int(np.floor(cols[inside].min())) - pad, 0)
+        row1 = min(int(np.floor(rows[inside].max())) + pad + 1, self.nrows)
+        col1 = min(int(np.floor(cols[inside].max())) + pad + 1, self.ncols)
+
+        return row0, col0, row1 - row0, col1 - col0
+
+    def sample(self, lat, long, method = "nearest"):
+        '''
+        Calculates the elevation in metres at each lat/long point
+        using nearest, bilinear or bicubic interpolation. Points
+        off the raster or on nodata pixels are NaN.
+        '''
+
+        if method not in INTERPOLATION:
+            raise ValueError("Unknown interpolation {}, expected one of {}".format(method, sorted(INTERPOLATION)))
+
+        rows, cols = self.pixels(lat, long)
+        elevation = np.full(rows.shape, np.nan)
+
+        window = self.bounding_window(rows, cols, pad = INTERPOLATION[method])
+        if window is None:
+            return elevation
+        row0, col0, nrows, ncols = window
+        arr_ele = self.read_window(row0, col0, nrows, ncols)
+
+        #Gather the neighbourhood of every point in one go
+        inside = (rows >= 0) & (rows < self.nrows) & (cols >= 0) & (cols < self.ncols)
+        r = rows[inside] - row0
+        c = cols[inside] - col0
+        values = _nearest(arr_ele, r, c)
+        if method == "bilinear":
+            interpolated = _bilinear(arr_ele, r, c)
+        elif method == "bicubic":
+            interpolated = _bicubic(arr_ele, r, c)
+        else:
+            interpolated = values
+
+        #Fall back to the containing pixel where a neighbour was nodata
+        elevation[inside] = np.where(np.isnan(interpolated), values, interpolated)
+
+        return elevation
+
+    def close(self):
+        '''
+        Releases the GDAL handles.
+        '''
+
+        self.mapped = None
+        self.band = None
+        self.dataset = None
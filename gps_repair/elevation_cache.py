@@ -0,0 +1,255 @@
+import numpy as np                            #Vectorized key math
+import sqlite3, time
+
+from .elevation import INTERPOLATION, _cubic_weights
+
+'''
+Persistent elevation cache so repeat repairs of the same
+loops skip raster reads.
+'''
+
+#Grid spacing for sources without pixels of their own, as the 1/3 arc-second 3DEP tiles
+RESOLUTION = 1 / 10800                        #degrees
+MAX_ENTRIES = 2000000
+CHUNK = 500                                   #keys per SQL statement
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS elevation (source INTEGER NOT NULL, key INTEGER NOT NULL, value REAL NOT NULL,
+                                      used INTEGER NOT NULL, PRIMARY KEY (source, key));
+CREATE INDEX IF NOT EXISTS elevation_used ON elevation (used);
+"""
+
+class ElevationCache(object):
+    '''
+    SQLite table of raw elevations keyed by the source they came
+    from and an integer node of that source's grid (see
+    CachedElevation). Holds at most max_entries values, evicting
+    the least recently used. resolution is the grid spacing in
+    degrees used for sources without a pixel grid of their own.
+    '''
+
+    def __init__(self, path, resolution = RESOLUTION, max_entries = MAX_ENTRIES):
+        self.path = path
+        self.resolution = resolution
+        self.max_entries = max_entries
+        self._connection = None
+        self._sources = {}
+
+    def __getstate__(self):
+        #sqlite3 connections can't be pickled, each process opens its own
+        state = self.__dict__.copy()
+        state["_connection"] = None
+
+        return state
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout = 60)
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.executescript(SCHEMA)
+
+        return self._connection
+
+    def source_id(self, name):
+        '''
+        Returns the id of a named elevation source, adding it if new.
+        '''
+
+        source = self._sources.get(name)
+        if source is None:
+            with self.connection as db:
+                db.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)", (name,))
+                source = db.execute("SELECT id FROM sources WHERE name = ?", (name,)).fetchone()[0]
+            self._sources[name] = source
+
+        return source
+
+    def get(self, source, keys):
+        '''
+        Looks up many keys at once. Returns their values with NaN
+        for the ones not cached, and marks the hits as used.
+        '''
+
+        keys = np.asarray(keys, dtype = np.int64)
+        values = np.full(len(keys), np.nan)
+        if not len(keys):
+            return values
+
+        found = {}
+        with self.connection as db:
+            for i in range(0, len(keys), CHUNK):
+                chunk = keys[i:i + CHUNK].tolist()
+                marks = ",".join("?" * len(chunk))
+                found.update(db.execute("SELECT key, value FROM elevation WHERE source = ? AND key IN ({})".format(marks),
+                                        [source] + chunk))
+                db.execute("UPDATE elevation SET used = ? WHERE source = ? AND key IN ({})".format(marks),
+                           [int(time.time()), source] + chunk)
+
+        if found:
+            hits = np.fromiter(found.keys(), dtype = np.int64, count = len(found))
+            order = np.argsort(hits)
+            hit_values = np.fromiter(found.values(), dtype = np.float64, count = len(found))[order]
+            hits = hits[order]
+            index = np.minimum(np.searchsorted(hits, keys), len(hits) - 1)
+            match = hits[index] == keys
+            values[match] = hit_values[index[match]]
+
+        return values
+
+    def put(self, source, keys, values):
+        '''
+        Stores many values at once, skipping NaN, then evicts the
+        least recently used values beyond max_entries.
+        '''
+
+        keys = np.asarray(keys, dtype = np.int64)
+        values = np.asarray(values, dtype = np.float64)
+        keep = ~np.isnan(values)
+        if not keep.any():
+            return
+
+        now = int(time.time())
+        with self.connection as db:
+            db.executemany("INSERT OR REPLACE INTO elevation (source, key, value, used) VALUES (?, ?, ?, ?)",
+                           ((source, key, value, now) for key, value in zip(keys[keep].tolist(), values[keep].tolist())))
+
+            excess = db.execute("SELECT COUNT(*) FROM elevation").fetchone()[0] - self.max_entries
+            if excess > 0:
+                db.execute("DELETE FROM elevation WHERE rowid IN "
+                           "(SELECT rowid FROM elevation ORDER BY used LIMIT ?)", (excess,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM elevation").fetchone()[0]
+
+    def clear(self):
+        '''
+        Deletes every cached value.
+        '''
+
+        with self.connection as db:
+            db.execute("DELETE FROM elevation")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+class CachedElevation(object):
+    '''
+    Puts an ElevationCache in front of any elevation source with
+    a sample(lat, long, method) method, such as a DEMIndex.
+
+    The cache holds the source's raw values at the nodes of its
+    pixel grid (the source's grid attribute, else a grid of the
+    cache's resolution), and points are interpolated from the
+    nodes around them after the lookup, the same way the tiles
+    are. Only nodes not seen before reach the source, each
+    sampled once at its centre, so for a DEMIndex cached and
+    uncached runs give the same values.
+    '''
+
+    def __init__(self, source, cache, name = None):
+        self.source = source
+        self.cache = cache
+        self.name = name or getattr(source, "name", type(source).__name__)
+        self._grid = None
+
+    @property
+    def grid(self):
+        '''
+        (lat, long) of a node and the node spacing in degrees.
+        '''
+
+        if self._grid is None:
+            self._grid = getattr(self.source, "grid", None) or (0.0, 0.0, self.cache.resolution, self.cache.resolution)
+
+        return self._grid
+
+    def node_keys(self, rows, cols):
+        '''
+        Integer cache key of each grid node.
+        '''
+
+        _, _, dlat, dlong = self.grid
+        width = 2 * int(round(360 / dlong)) + 1
+
+        return (rows + int(round(180 / dlat))) * width + cols + width // 2
+
+    def nodes(self, rows, cols):
+        '''
+        Raw values at grid nodes, from the cache where possible.
+        Nodes the source has no data for are NaN.
+        '''
+
+        lat0, long0, dlat, dlong = self.grid
+        rows, cols = np.broadcast_arrays(rows, cols)
+        keys = self.node_keys(rows, cols)
+        unique, first, inverse = np.unique(keys, return_index = True, return_inverse = True)
+
+        source = self.cache.source_id("{}@{!r}".format(self.name, self.grid))
+        values = self.cache.get(source, unique)
+        missing = np.isnan(values)
+        if missing.any():
+            points = first[missing]
+            values[missing] = self.source.sample(lat0 + rows.ravel()[points] * dlat,
+                                                 long0 + cols.ravel()[points] * dlong, "nearest")
+            self.cache.put(source, unique[missing], values[missing])
+
+        return values[inverse].reshape(np.shape(rows))
+
+    def sample(self, lat, long, method = "nearest"):
+        '''
+        Calculates the elevation at each lat/long point from the
+        grid nodes around it, with nearest, bilinear or bicubic
+        interpolation, falling back to the nearest node where a
+        neighbour has no data. Points the source has no data for
+        are NaN.
+        '''
+
+        if method not in INTERPOLATION:
+            raise ValueError("Unknown interpolation {}, expected one of {}".format(method, sorted(INTERPOLATION)))
+
+        shape = np.shape(lat)
+        lat0, long0, dlat, dlong = self.grid
+        rows = (np.asarray(lat, dtype = np.float64).ravel() - lat0) / dlat
+        cols = (np.asarray(long, dtype = np.float64).ravel() - long0) / dlong
+        valid = ~np.isnan(rows) & ~np.isnan(cols)
+        rows = np.where(valid, rows, 0)
+        cols = np.where(valid, cols, 0)
+
+        #The 1, 2x2 or 4x4 nodes around each point
+        pad = INTERPOLATION[method]
+        if pad:
+            r0 = np.floor(rows).astype(np.int64) - (pad - 1)
+            c0 = np.floor(cols).astype(np.int64) - (pad - 1)
+        else:
+            r0 = np.rint(rows).astype(np.int64)
+            c0 = np.rint(cols).astype(np.int64)
+        offsets = np.arange(max(2 * pad, 1))
+        values = self.nodes(r0[:, None, None] + offsets[None, :, None], c0[:, None, None] + offsets[None, None, :])
+
+        t = rows - np.floor(rows)
+        u = cols - np.floor(cols)
+        if method == "bilinear":
+            row_weights = np.stack((1 - t, t), axis = 1)
+            col_weights = np.stack((1 - u, u), axis = 1)
+        elif method == "bicubic":
+            row_weights = np.stack(_cubic_weights(t), axis = 1)
+            col_weights = np.stack(_cubic_weights(u), axis = 1)
+        else:
+            row_weights = col_weights = np.ones((len(rows), 1))
+        elevation = np.einsum("nk,nkl,nl->n", row_weights, values, col_weights)
+
+        #Fall back to the nearest node where a neighbour had no data
+        index = np.arange(len(rows))
+        nearest = values[index, np.rint(rows).astype(np.int64) - r0, np.rint(cols).astype(np.int64) - c0]
+        elevation = np.where(np.isnan(elevation), nearest, elevation)
+        elevation[~valid] = np.nan
+
+        return elevation.reshape(shape)
+
+    def close(self):
+        self.source.close()
+        self.cache.close()
@@ -0,0 +1,125 @@
+from array import array                       #Compact typed columns
+from time import gmtime                       #Activity date
+import numpy as np                            #Bulk conversions
+
+from .track import Track
+
+'''
+Single pass reader for the record messages of a FIT file.
+'''
+
+#Seconds between the unix epoch and the FIT epoch (1989-12-31 00:00:00 UTC)
+FIT_EPOCH = 631065600
+SEMI_TO_DEGREE = 180 / 2**31
+SECONDS_PER_DAY = 24 * 3600
+
+def semi_to_degree(pos):
+    '''
+    Converts longitude/latitude in semicircles
+    to units of degrees.
+    '''
+
+    return pos * SEMI_TO_DEGREE
+
+class FitRecords(Track):
+    '''
+    Track read from the record messages of a FIT file.
+
+    vel is the enhanced speed in m/s (NaN when the watch did not
+    log it) and time/anom_time are seconds since midnight of the
+    activity date, so runs past 24:00 keep counting up. anom_time
+    holds the timestamps of records that had no GPS position.
+    Elevation is left unknown.
+    '''
+
+    __slots__ = ("anom_time",)
+
+    def __init__(self, data, anom_time, date, midnight):
+        Track.__init__(self, data, date, midnight)
+        self.anom_time = anom_time
+
+def read_fit(file):
+    '''
+    Reads latitude, longitude, speed and timestamps from the record
+    messages of a fitparse.FitFile in a single pass. Each record's
+    fields are visited once and collected into typed arrays, which
+    are converted to degrees and seconds in bulk afterwards.
+    '''
+
+    lat = array("i")
+    long = array("i")
+    stamps = array("I")
+    vel = array("d")
+    anom_stamps = array("I")
+
+    for record in file.get_messages("record"):
+        position_lat = position_long = stamp = speed = None
+
+        #Grab everything needed from a single walk over the fields
+        for field in record.fields:
+            name = field.name
+            if name == "position_lat":
+                position_lat = field.raw_value
+            elif name == "position_long":
+                position_long = field.raw_value
+            elif name == "timestamp":
+                stamp = field.raw_value
+            elif name == "enhanced_speed":
+                speed = field.value
+
+        if stamp is None:
+            continue
+
+        #Skip weird GPS issues
+        if position_lat and position_long is not None:
+            lat.append(position_lat)
+            long.append(position_long)
+            stamps.append(stamp)
+            vel.append(float("nan") if speed is None else speed)
+        else:
+            #Anomalous time where no lat/long coords
+            anom_stamps.append(stamp)
+
+    #Units of semicircles for lat and long
+    lat = semi_to_degree(np.frombuffer(lat, dtype = np.int32))
+    long = semi_to_degree(np.frombuffer(long, dtype = np.int32))
+    stamps = np.frombuffer(stamps, dtype = np.uint32).astype(np.int64) + FIT_EPOCH
+    anom_stamps = np.frombuffer(anom_stamps, dtype = np.uint32).astype(np.int64) + FIT_EPOCH
+
+    #Activity date is taken from the first timestamped record
+    first = [s[0] for s in (stamps, anom_stamps) if len(s)]
+    if first:
+        start = int(min(first))
+        d = gmtime(start)
+        date = "{}-{:02d}-{:02d}".format(d.tm_year, d.tm_mon, d.tm_mday)
+        midnight = start - start % SECONDS_PER_DAY
+    else:
+        date = None
+        midnight = 0
+
+    #Columns go straight into the track's buffer
+    track = Track.from_columns(lat, long, stamps - midnight, np.frombuffer(vel, dtype = np.float64))
+
+    return FitRecords(track.data, (anom_stamps - midnight).astype(np.float64), date, midnight)
+
+def merge_records(records):
+    '''
+    Joins the records of several FIT files of the same activity,
+    in order, into one FitRecords. Times are shifted onto the
+    first file's midnight.
+    '''
+
+    first = records[0]
+    shifts = [r.midnight - first.midnight for r in records]
+
+    #Rows are copied once into the merged buffer, then times shifted in place
+    data = np.concatenate([r.data for r in records])
+    k = 0
+    for r, shift in zip(records, shifts):
+        data["time"][k:k + len(r)] += shift
+        k += len(r)
+
+    return FitRecords(data,
+                      np.concatenate([r.anom_time + shift for r, shift in zip(records, shifts)]),
+                      first.date,
+                      first.midnight)
@@ -0,0 +1,445 @@
+from bisect import bisect_right               #Template record lookup
+from collections import OrderedDict           #Local message type slots
+import struct
+import numpy as np                            #Bulk unit conversions
+
+from .distance import cumulative_distances
+from .fit_reader import FIT_EPOCH, SEMI_TO_DEGREE
+
+'''
+Binary .fit output for repaired activities.
+
+The original message stream is copied as is, except for the
+record messages inside each repaired segment, which are
+replaced by records built from the repaired GPS track, and
+distances, which are shifted to match it.
+'''
+
+#Base type id -> (struct format, invalid value)
+BASE_TYPES = {
+    0x00: ("B", 0xFF),
+    0x01: ("b", 0x7F),
+    0x02: ("B", 0xFF),
+    0x83: ("h", 0x7FFF),
+    0x84: ("H", 0xFFFF),
+    0x85: ("i", 0x7FFFFFFF),
+    0x86: ("I", 0xFFFFFFFF),
+    0x07: ("s", 0x00),
+    0x88: ("f", float("nan")),
+    0x89: ("d", float("nan")),
+    0x0A: ("B", 0x00),
+    0x8B: ("H", 0x0000),
+    0x8C: ("I", 0x00000000),
+    0x0D: ("B", 0xFF),
+    0x8E: ("q", 0x7FFFFFFFFFFFFFFF),
+    0x8F: ("Q", 0xFFFFFFFFFFFFFFFF),
+    0x90: ("Q", 0x0000000000000000),
+}
+
+#Record message and the field numbers rewritten for repaired points
+RECORD = 20
+TIMESTAMP = 253
+POSITION_LAT = 0
+POSITION_LONG = 1
+ALTITUDE = 2
+DISTANCE = 5
+ENHANCED_ALTITUDE = 78
+
+#Summary messages and the fields recomputed from the written records
+LAP = 19
+SESSION = 18
+START_TIME = 2
+TOTAL_ELAPSED_TIME = 7                        #ms
+TOTAL_DISTANCE = 9                            #cm
+
+#(base type, size) used when a repaired record has no template for a field
+RECORD_FIELDS = {
+    TIMESTAMP: (0x86, 4),
+    POSITION_LAT: (0x85, 4),
+    POSITION_LONG: (0x85, 4),
+    ENHANCED_ALTITUDE: (0x86, 4),
+}
+
+HEADER_SIZE = 14
+PROTOCOL_VERSION = 0x20
+PROFILE_VERSION = 2132
+MAX_LOCAL_MESSAGES = 16
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+
+    return table
+
+CRC_TABLE = _crc_table()
+
+def crc16(data, crc = 0):
+    '''
+    FIT CRC-16 of a bytes-like object, continuing from crc.
+    '''
+
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+
+    return crc
+
+def _pack_field(base_type, size, value):
+    '''
+    Encodes a raw field value (as parsed by fitparse) into
+    size bytes, writing invalid values for anything missing.
+    '''
+
+    fmt, invalid = BASE_TYPES.get(base_type, BASE_TYPES[0x0D])
+
+    if fmt == "s":
+        data = value.encode("utf-8") if isinstance(value, str) else bytes(value or b"")
+        return data[:size].ljust(size, b"\x00")
+
+    count = size // struct.calcsize(fmt)
+    values = list(value) if isinstance(value, (tuple, list)) else [value]
+    values = [invalid if v is None else v for v in values[:count]]
+    values += [invalid] * (count - len(values))
+
+    return struct.pack("<" + fmt * count, *values)
+
+class FitEncoder(object):
+    '''
+    Writes FIT messages to a binary file, emitting definition
+    messages as needed and recycling the 16 local message
+    types on a least recently used basis.
+    '''
+
+    def __init__(self, f):
+        self.f = f
+        self.f.write(b"\x00" * HEADER_SIZE)
+        self.data_size = 0
+
+        #Message layout -> local type, least recently used first
+        self._locals = OrderedDict()
+
+    def _local_type(self, key):
+        '''
+        Returns (local type, needs definition) for a message layout.
+        '''
+
+        local = self._locals.pop(key, None)
+        if local is not None:
+            self._locals[key] = local
+            return local, False
+
+        if len(self._locals) < MAX_LOCAL_MESSAGES:
+            local = len(self._locals)
+        else:
+            #Reuse the slot of the least recently used layout
+            _, local = self._locals.popitem(last = False)
+        self._locals[key] = local
+
+        return local, True
+
+    def write_message(self, mesg_num, fields, dev_fields = ()):
+        '''
+        Writes one data message. fields is a list of (field number,
+        base type, size, raw value) and dev_fields a list of
+        (field number, developer data index, base type, size,
+        raw value).
+        '''
+
+        key = (mesg_num,
+               tuple((num, base_type, size) for num, base_type, size, _ in fields),
+               tuple((num, index, size) for num, index, _, size, _ in dev_fields))
+
+        local, define = self._local_type(key)
+        if define:
+            self._write_definition(local, key)
+
+        chunks = [struct.pack("<B", local)]
+        chunks.extend(_pack_field(base_type, size, value) for _, base_type, size, value in fields)
+        chunks.extend(_pack_field(base_type, size, value) for _, _, base_type, size, value in dev_fields)
+        self._write(b"".join(chunks))
+
+    def _write_definition(self, local, key):
+        mesg_num, fields, dev_fields = key
+
+        header = 0x40 | local
+        if dev_fields:
+            header |= 0x20
+
+        chunks = [struct.pack("<BBBHB", header, 0, 0, mesg_num, len(fields))]
+        chunks.extend(struct.pack("<BBB", num, size, base_type) for num, base_type, size in fields)
+        if dev_fields:
+            chunks.append(struct.pack("<B", len(dev_fields)))
+            chunks.extend(struct.pack("<BBB", num, size, index) for num, index, size in dev_fields)
+        self._write(b"".join(chunks))
+
+    def _write(self, data):
+        self.f.write(data)
+        self.data_size += len(data)
+
+    def close(self):
+        '''
+        Fills in the header and appends the file CRC. The file
+        must be opened for reading and writing.
+        '''
+
+        header = struct.pack("<BBHI4s", HEADER_SIZE, PROTOCOL_VERSION, PROFILE_VERSION, self.data_size, b".FIT")
+        header += struct.pack("<H", crc16(header))
+        self.f.seek(0)
+        self.f.write(header)
+
+        #CRC covers the header and every message, read back in blocks
+        self.f.seek(0)
+        crc = 0
+        while True:
+            block = self.f.read(1 << 16)
+            if not block:
+                break
+            crc = crc16(block, crc)
+        self.f.seek(0, 2)
+        self.f.write(struct.pack("<H", crc))
+
+def _message_fields(message):
+    '''
+    Splits a fitparse data message into encodable fields and
+    developer fields, skipping values expanded from components.
+    '''
+
+    fields = []
+    dev_fields = []
+    for field in message.fields:
+        field_def = field.field_def
+        if field_def is None:
+            continue
+
+        if hasattr(field_def, "dev_data_index"):
+            dev_fields.append((field_def.def_num, field_def.dev_data_index,
+                               field_def.base_type.identifier, field_def.size, field.raw_value))
+        else:
+            fields.append((field_def.def_num, field_def.base_type.identifier, field_def.size, field.raw_value))
+
+    return fields, dev_fields
+
+def _timestamp(message):
+    '''
+    Raw FIT timestamp of a message, including ones carried by
+    a compressed timestamp header.
+    '''
+
+    for field in message.fields:
+        if field.name == "timestamp":
+            return field.raw_value
+
+    return None
+
+class _Segment(object):
+    '''
+    A repaired stretch of the activity and the original records
+    it replaces.
+    '''
+
+    def __init__(self, track):
+        self.lat = track.lat
+        self.long = track.long
+        self.stamps = np.floor(track.epoch).astype(np.int64) - FIT_EPOCH
+        self.elevation = track.elevation
+        self.start = int(self.stamps[0])
+        self.end = int(self.stamps[-1])
+        self.templates = []
+        self.template_stamps = []
+        self.source = None
+        self.written = False
+
+    def contains(self, stamp):
+        return self.start <= stamp <= self.end
+
+def _record_fields(fields, stamp, lat, long, elevation):
+    '''
+    Copies a template record's fields and overwrites its time,
+    position and altitude with the repaired values.
+    '''
+
+    values = dict((num, [base_type, size, value]) for num, base_type, size, value in fields)
+    for num in (TIMESTAMP, POSITION_LAT, POSITION_LONG):
+        values.setdefault(num, list(RECORD_FIELDS[num]) + [None])
+
+    values[TIMESTAMP][2] = stamp
+    values[POSITION_LAT][2] = int(round(lat / SEMI_TO_DEGREE))
+    values[POSITION_LONG][2] = int(round(long / SEMI_TO_DEGREE))
+
+    if elevation is not None and elevation == elevation:
+        #Both altitude fields are stored as (metres + 500) * 5
+        raw = int(round((elevation + 500) * 5))
+        if ALTITUDE in values and raw <= 0xFFFE:
+            values[ALTITUDE][2] = raw
+        values.setdefault(ENHANCED_ALTITUDE, list(RECORD_FIELDS[ENHANCED_ALTITUDE]) + [None])
+        values[ENHANCED_ALTITUDE][2] = raw
+
+    return [(num, base_type, size, value) for num, (base_type, size, value) in values.items()]
+
+def _summary_fields(mesg_num, fields, stamp, written_stamps, distance_at):
+    '''
+    Recomputes the total distance of a lap or session ending at
+    stamp from the records written so far. A session also starts
+    with the first record, covering every file of a split
+    activity, and its elapsed time is updated to match.
+    '''
+
+    if not written_stamps:
+        return fields
+
+    values = dict((num, value) for num, _, _, value in fields)
+    start = values.get(START_TIME)
+    replace = {}
+    if mesg_num == SESSION:
+        start = written_stamps[0] if start is None else min(start, written_stamps[0])
+        replace[START_TIME] = start
+        replace[TOTAL_ELAPSED_TIME] = (stamp - start) * 1000
+
+    end_distance = distance_at(stamp)
+    if end_distance is not None:
+        start_distance = distance_at(start - 1) if start is not None else None
+        replace[TOTAL_DISTANCE] = end_distance - (start_distance or 0)
+
+    return [(num, base_type, size, replace[num] if num in replace and value is not None else value)
+            for num, base_type, size, value in fields]
+
+def _merged_messages(sources):
+    '''
+    The messages of the last source, with the record and lap
+    messages of the sources before it put ahead of its first
+    record, each paired with the index of the file it came from.
+    '''
+
+    last = len(sources) - 1
+    messages = list(sources[-1].get_messages())
+    first = next((k for k, message in enumerate(messages) if message.mesg_num == RECORD), len(messages))
+    earlier = [(message, i) for i, source in enumerate(sources[:-1])
+               for message in source.get_messages() if message.mesg_num in (RECORD, LAP)]
+
+    return [(message, last) for message in messages[:first]] + earlier + [(message, last) for message in messages[first:]]
+
+def write_fit(path, sources, segments):
+    '''
+    Writes a repaired activity as a .fit file. sources is the
+    original fitparse.FitFile, or a list of them in order for an
+    activity split over several files, and segments a list of
+    Tracks, each replacing the original records that fall in its
+    time span. The records and laps of every file are written,
+    with the other messages of the last one. Heart rate, cadence,
+    power and every other field of the replaced records are
+    carried over from the nearest original record, and distances
+    run on through each segment and across files. The total
+    distance of every lap and session, and the start and elapsed
+    time of the session, are recomputed from the written records.
+    '''
+
+    if not isinstance(sources, (list, tuple)):
+        sources = [sources]
+    segments = sorted((_Segment(track) for track in segments), key = lambda segment: segment.start)
+    messages = _merged_messages(sources)
+
+    #First pass collects the records each segment replaces
+    for message, source in messages:
+        if message.mesg_num != RECORD:
+            continue
+        stamp = _timestamp(message)
+        for segment in segments:
+            if stamp is not None and segment.contains(stamp):
+                segment.templates.append(_message_fields(message))
+                segment.template_stamps.append(stamp)
+                segment.source = source
+                break
+
+    with open(path, "w+b") as f:
+        encoder = FitEncoder(f)
+
+        #Original distances are written as value + offset, in the frame of the file they came from
+        state = {"offset": 0, "last": None, "source": None}
+
+        #Timestamp and distance of every record written, for the summaries
+        written_stamps = []
+        written_distances = []
+
+        def distance_at(stamp):
+            k = bisect_right(written_stamps, stamp) - 1
+            return written_distances[k] if k >= 0 else None
+
+        def write_segment(segment):
+            '''
+            Writes the repaired records of a segment, carrying the
+            distance on from the record before it (or 0).
+            '''
+
+            start = 0 if state["last"] is None else state["last"]
+            distances = start + np.rint(cumulative_distances(segment.lat, segment.long) * 100)
+
+            for i in range(len(segment.stamps)):
+                stamp = int(segment.stamps[i])
+                if segment.templates:
+                    j = max(bisect_right(segment.template_stamps, stamp) - 1, 0)
+                    fields, dev_fields = segment.templates[j]
+                else:
+                    fields, dev_fields = [], []
+
+                fields = _record_fields(fields, stamp, segment.lat[i], segment.long[i], segment.elevation[i])
+                fields = [(num, base_type, size, int(distances[i]) if num == DISTANCE else value)
+                          for num, base_type, size, value in fields]
+                encoder.write_message(RECORD, fields, dev_fields)
+            segment.written = True
+            state["last"] = int(distances[-1])
+            written_stamps.extend(segment.stamps.tolist())
+            written_distances.extend(distances.astype(np.int64).tolist())
+
+            #Records after the segment continue from the repaired distance
+            original = [value for fields, _ in segment.templates[-1:] for num, _, _, value in fields
+                        if num == DISTANCE and value is not None]
+            if original:
+                state["offset"] = state["last"] - original[0]
+                state["source"] = segment.source
+
+        for message, source in messages:
+            fields, dev_fields = _message_fields(message)
+            stamp = _timestamp(message)
+
+            if message.mesg_num == RECORD and stamp is not None:
+                #Segments with no original records go in before the first record after them
+                for segment in segments:
+                    if not segment.written and (segment.contains(stamp) or segment.end < stamp):
+                        write_segment(segment)
+
+                if any(segment.contains(stamp) for segment in segments):
+                    continue
+
+                #Compressed timestamps are written out explicitly
+                if TIMESTAMP not in [num for num, _, _, _ in fields]:
+                    fields.append((TIMESTAMP,) + RECORD_FIELDS[TIMESTAMP] + (stamp,))
+
+                for k, (num, base_type, size, value) in enumerate(fields):
+                    if num == DISTANCE and value is not None:
+                        #Each file counts its distance from 0, so a new file carries on from the last record
+                        if source != state["source"]:
+                            state["offset"] = 0 if state["last"] is None else state["last"] - value
+                            state["source"] = source
+                        fields[k] = (num, base_type, size, value + state["offset"])
+                        state["last"] = value + state["offset"]
+                        written_stamps.append(stamp)
+                        written_distances.append(state["last"])
+
+            elif message.mesg_num in (LAP, SESSION) and stamp is not None:
+                #Everything the summary covers has to be written first
+                for segment in segments:
+                    if not segment.written and segment.end <= stamp:
+                        write_segment(segment)
+                fields = _summary_fields(message.mesg_num, fields, stamp, written_stamps, distance_at)
+
+            encoder.write_message(message.mesg_num, fields, dev_fields)
+
+        for segment in segments:
+            if not segment.written:
+                write_segment(segment)
+
+        encoder.close()
@@ -0,0 +1,81 @@
+from datetime import date                     #Calendar date of each day
+import numpy as np                            #Bulk timestamp arithmetic
+
+'''
+Streaming .gpx writer for repaired tracks.
+'''
+
+SECONDS_PER_DAY = 24 * 3600
+CHUNK_SIZE = 4096
+
+#GPX coordinates and elevations are xsd:decimal, which has no exponents
+POINT = '      <trkpt lat="{:.8f}" lon="{:.8f}">\n'     #about 1 mm
+ELEVATION = "        <ele>{:.3f}</ele>\n"
+
+HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+          'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+          'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd" '
+          'version="1.1" creator="GPS-File-Repair">\n'
+          '  <trk>\n'
+          '    <trkseg>\n')
+FOOTER = ('    </trkseg>\n'
+          '  </trk>\n'
+          '</gpx>\n')
+
+def format_times(time, midnight):
+    '''
+    Formats seconds since midnight as UTC ISO 8601 timestamps
+    using integer arithmetic instead of datetime parsing.
+    Fractional seconds are written to the millisecond.
+    '''
+
+    epoch = midnight + np.asarray(time, dtype = np.float64)
+    millis = np.rint(epoch * 1000).astype(np.int64)
+    days, millis = np.divmod(millis, SECONDS_PER_DAY * 1000)
+    seconds, millis = np.divmod(millis, 1000)
+    hours, seconds = np.divmod(seconds, 3600)
+    minutes, seconds = np.divmod(seconds, 60)
+
+    #Only a handful of distinct days in any activity
+    day_names = {}
+    stamps = []
+    for d, h, m, s, ms in zip(days.tolist(), hours.tolist(), minutes.tolist(), seconds.tolist(), millis.tolist()):
+        name = day_names.get(d)
+        if name is None:
+            name = day_names[d] = date.fromordinal(date(1970, 1, 1).toordinal() + d).isoformat()
+
+        if ms:
+            stamps.append("{}T{:02d}:{:02d}:{:02d}.{:03d}Z".format(name, h, m, s, ms))
+        else:
+            stamps.append("{}T{:02d}:{:02d}:{:02d}Z".format(name, h, m, s))
+
+    return stamps
+
+def write_gpx(path, track):
+    '''
+    Writes a Track to a .gpx file. Points are formatted and
+    written in chunks straight from the track's columns so the
+    whole document is never held in memory. Missing (NaN)
+    elevations are left out.
+    '''
+
+    lat, long, elevation, time = track.lat, track.long, track.elevation, track.time
+
+    with open(path, "w", encoding = "utf-8", buffering = 1 << 16) as f:
+        f.write(HEADER)
+
+        for start in range(0, len(lat), CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            stamps = format_times(time[start:end], track.midnight)
+
+            lines = []
+            for la, lo, ele, stamp in zip(lat[start:end].tolist(), long[start:end].tolist(),
+                                          elevation[start:end].tolist(), stamps):
+                lines.append(POINT.format(la, lo))
+                if ele == ele:
+                    lines.append(ELEVATION.format(ele))
+                lines.append("        <time>{}</time>\n      </trkpt>\n".format(stamp))
+            f.write("".join(lines))
+
+        f.write(FOOTER)
@@ -0,0 +1,130 @@
+import numpy as np                            #Vectorized segment projection
+
+'''
+Map matching: snaps noisy GPS points onto a planned route so
+they keep their real timestamps. Works on tracks projected to
+metres (see projection.LocalProjection).
+'''
+
+#Defaults
+MATCH_RADIUS = 50.0                           #metres, farther points are left unmatched
+MATCH_TOLERANCE = 10.0                        #metres, candidates this close to the nearest are ties
+BACKTRACK = 50.0                              #metres a point may snap behind the one before it
+MIN_MATCHED = 0.5                             #fraction of points that must snap for the timing to be used
+KEY_OFFSET = 1 << 30
+
+def _cell_keys(ix, iy):
+    return (ix + KEY_OFFSET) * (2 * KEY_OFFSET) + iy + KEY_OFFSET
+
+class SegmentGrid(object):
+    '''
+    Uniform grid over the segments of a polyline. Each cell lists
+    the segments whose bounding box touches it, stored as one
+    sorted array of cell keys with offsets into the segment ids.
+    '''
+
+    def __init__(self, east, north, cell = MATCH_RADIUS):
+        self.east = np.asarray(east, dtype = np.float64)
+        self.north = np.asarray(north, dtype = np.float64)
+        self.cell = cell
+
+        #Cells covered by each segment's bounding box
+        ix0 = np.floor(np.minimum(self.east[:-1], self.east[1:]) / cell).astype(np.int64)
+        ix1 = np.floor(np.maximum(self.east[:-1], self.east[1:]) / cell).astype(np.int64)
+        iy0 = np.floor(np.minimum(self.north[:-1], self.north[1:]) / cell).astype(np.int64)
+        iy1 = np.floor(np.maximum(self.north[:-1], self.north[1:]) / cell).astype(np.int64)
+        width = ix1 - ix0 + 1
+        counts = width * (iy1 - iy0 + 1)
+
+        segments = np.repeat(np.arange(len(counts)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        keys = _cell_keys(ix0[segments] + k % width[segments], iy0[segments] + k // width[segments])
+
+        order = np.argsort(keys, kind = "stable")
+        keys = keys[order]
+        self.segments = segments[order]
+        self.keys, self.starts = np.unique(keys, return_index = True)
+        self.ends = np.append(self.starts[1:], len(keys))
+
+    def candidates(self, x, y, radius):
+        '''
+        Returns (point, segment) index pairs for every segment in
+        the cells within radius of each point. Pairs may repeat.
+        '''
+
+        reach = int(np.ceil(radius / self.cell))
+        dx, dy = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1))
+        ix = np.floor(x / self.cell).astype(np.int64)[:, None] + dx.ravel()
+        iy = np.floor(y / self.cell).astype(np.int64)[:, None] + dy.ravel()
+        keys = _cell_keys(ix, iy).ravel()
+        points = np.repeat(np.arange(len(x)), dx.size)
+
+        #Only cells that hold segments
+        found = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        hit = self.keys[found] == keys
+        points = points[hit]
+        found = found[hit]
+
+        counts = self.ends[found] - self.starts[found]
+        points = np.repeat(points, counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        #A segment spanning several cells comes up once per cell
+        return points, self.segments[np.repeat(self.starts[found], counts) + k]
+
+def match_points(east, north, x, y, radius = MATCH_RADIUS, tolerance = MATCH_TOLERANCE):
+    '''
+    Snaps each point (x, y) onto the route polyline (east, north),
+    in order. Returns the arc length in metres along the route of
+    each snapped point, never decreasing, with NaN for points
+    farther than radius from the route.
+
+    Of the route positions within tolerance of a point's nearest
+    one, the first not behind the previous point wins, so
+    out-and-back legs and crossings are followed in order rather
+    than jumping to a later pass. Points only near positions
+    already passed are left unmatched.
+    '''
+
+    east = np.asarray(east, dtype = np.float64)
+    north = np.asarray(north, dtype = np.float64)
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    arc = np.full(len(x), np.nan)
+    if len(east) < 2 or not len(x):
+        return arc
+
+    grid = SegmentGrid(east, north, radius)
+    points, segments = grid.candidates(x, y, radius)
+
+    #Project every candidate pair at once
+    sx = east[1:] - east[:-1]
+    sy = north[1:] - north[:-1]
+    length = np.hypot(sx, sy)
+    start = np.concatenate(([0], np.cumsum(length)))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        t = ((x[points] - east[segments]) * sx[segments] + (y[points] - north[segments]) * sy[segments]) / length[segments] ** 2
+    t = np.clip(np.nan_to_num(t), 0, 1)
+    distance = np.hypot(east[segments] + t * sx[segments] - x[points], north[segments] + t * sy[segments] - y[points])
+    along = start[segments] + t * length[segments]
+
+    #Only positions about as close as the nearest one are worth considering
+    closest = np.full(len(x), np.inf)
+    np.minimum.at(closest, points, distance)
+    near = (distance <= radius) & (distance <= closest[points] + tolerance)
+    points = points[near]
+    along = along[near]
+
+    #Walk the points in order, taking the first candidate not behind the one before
+    order = np.lexsort((along, points))
+    bounds = np.searchsorted(points[order], np.arange(len(x) + 1)).tolist()
+    along = along[order].tolist()
+    previous = 0.0
+    for i in range(len(x)):
+        for a in along[bounds[i]:bounds[i + 1]]:
+            if a >= previous - BACKTRACK:
+                previous = max(previous, a)
+                arc[i] = previous
+                break
+
+    return arc
@@ -0,0 +1,158 @@
+from contextlib import contextmanager        #Timed stages
+from time import perf_counter                 #Wall time
+import json, tracemalloc
+
+'''
+Per-stage timing, point counts and memory of a repair run.
+'''
+
+#Allocation sites kept for a profiled stage
+TOP_ALLOCATIONS = 10
+
+class Metrics(object):
+    '''
+    Records each stage of a run as it happens. With memory, the
+    peak traced memory of every stage is kept too (tracemalloc
+    is started for the run if it isn't already). profile names a
+    stage to run under cProfile, with its stats saved to
+    profile_path, and the lines that allocated the most memory
+    during it recorded when memory is on.
+
+    Stages may open inside one another, like a table fitted only
+    once the fix stage finds it needs one. The time spent in the
+    inner stage counts for it alone, so the stage times still
+    add up to the run, while the outer stage's peak memory
+    includes the inner one's.
+    '''
+
+    def __init__(self, memory = False, profile = None, profile_path = None):
+        self.memory = memory
+        self.profile = profile
+        self.profile_path = profile_path
+        self.stages = []
+        self._open = []                       #stages entered and not yet left, innermost last
+        self._started_tracing = False
+        self._start = perf_counter()
+        self._end = None
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    @contextmanager
+    def stage(self, name, points = None):
+        '''
+        Times the body of a with block as one stage. Yields its
+        record so the point count can be filled in once known.
+        '''
+
+        record = {"name": name, "seconds": None, "points": points}
+        profiler = None
+        if name == self.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+        frame = {"base": 0, "peak": 0, "inner": 0.0}
+        if self.memory:
+            before = tracemalloc.take_snapshot() if profiler is not None else None
+            #Keep the enclosing stage's peak so far before resetting it
+            if self._open:
+                outer = self._open[-1]
+                outer["peak"] = max(outer["peak"], tracemalloc.get_traced_memory()[1] - outer["base"])
+            tracemalloc.reset_peak()
+            frame["base"] = tracemalloc.get_traced_memory()[0]
+
+        self._open.append(frame)
+        start = perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = perf_counter() - start
+            self._open.pop()
+            record["seconds"] = elapsed - frame["inner"]
+            if self._open:
+                self._open[-1]["inner"] += elapsed
+
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                record["peak_bytes"] = max(frame["peak"], peak - frame["base"])
+                if self._open:
+                    outer = self._open[-1]
+                    outer["peak"] = max(outer["peak"], peak - outer["base"])
+                if profiler is not None:
+                    stats = tracemalloc.take_snapshot().compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+                    record["allocations"] = [{"site": str(stat.traceback[0]), "bytes": stat.size_diff} for stat in stats]
+            if profiler is not None:
+                profiler.dump_stats(self.profile_path or name + ".prof")
+
+            self.stages.append(record)
+
+    def close(self):
+        '''
+        Ends the run, stopping tracemalloc if this run started it.
+        '''
+
+        self._end = perf_counter()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def report(self):
+        '''
+        Returns the run as a dict ready for JSON. Stages that ran
+        more than once, like one per bad segment, are combined.
+        '''
+
+        stages = {}
+        for record in self.stages:
+            total = stages.get(record["name"])
+            if total is None:
+                stages[record["name"]] = dict(record, calls = 1)
+                continue
+
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            if record["points"] is not None:
+                total["points"] = (total["points"] or 0) + record["points"]
+            if "peak_bytes" in record:
+                total["peak_bytes"] = max(total.get("peak_bytes", 0), record["peak_bytes"])
+
+        end = perf_counter() if self._end is None else self._end
+
+        return {"seconds": end - self._start, "stages": list(stages.values())}
+
+    def write(self, path):
+        '''
+        Writes the report as JSON.
+        '''
+
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent = 2)
+
+def aggregate(reports):
+    '''
+    Combines the reports of many runs into totals, means and
+    maxima per stage.
+    '''
+
+    stages = {}
+    for report in reports:
+        for stage in report["stages"]:
+            total = stages.setdefault(stage["name"], {"name": stage["name"], "runs": 0, "seconds": 0.0,
+                                                      "max_seconds": 0.0, "points": 0, "peak_bytes": None})
+            total["runs"] += 1
+            total["seconds"] += stage["seconds"]
+            total["max_seconds"] = max(total["max_seconds"], stage["seconds"])
+            total["points"] += stage["points"] or 0
+            if "peak_bytes" in stage:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0, stage["peak_bytes"])
+
+    for total in stages.values():
+        total["mean_seconds"] = total["seconds"] / total["runs"]
+
+    return {"runs": len(reports),
+            "seconds": sum(report["seconds"] for report in reports),
+            "stages": list(stages.values())}
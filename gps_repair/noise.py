@@ -0,0 +1,64 @@
+import numpy as np                            #Seeded batch draws
+
+'''
+Random perturbations that make a fixed segment look like
+real GPS data.
+'''
+
+#Standard deviations of the perturbations
+POSITION_SCALE = 2.0                          #metres, normal to the direction of travel
+ALONG_TRACK = 0.25                            #fraction of POSITION_SCALE along it
+PACE_SCALE = 0.2                              #min/mile
+
+class Noise(object):
+    '''
+    Draws all the perturbations for a route in single array
+    calls from a seeded numpy Generator, so repairs can be
+    reproduced exactly by reusing the seed.
+    '''
+
+    def __init__(self, seed = None, position_scale = POSITION_SCALE, pace_scale = PACE_SCALE):
+        self.rng = np.random.default_rng(seed)
+        self.position_scale = position_scale
+        self.pace_scale = pace_scale
+
+    def perturb_route(self, east, north):
+        '''
+        Adds noise in metres to every point of a projected route
+        except its start and end, mostly along the normal to the
+        direction of travel at each point. Returns new arrays.
+        '''
+
+        east = np.array(east, dtype = np.float64)
+        north = np.array(north, dtype = np.float64)
+        n = len(east) - 2
+        if n <= 0:
+            return east, north
+
+        #Direction of travel at each point is the mean of the segments either side
+        dx = np.diff(east)
+        dy = np.diff(north)
+        length = np.hypot(dx, dy)
+        length[length == 0] = 1
+        ux = dx / length
+        uy = dy / length
+        tx = ux[:-1] + ux[1:]
+        ty = uy[:-1] + uy[1:]
+        norm = np.hypot(tx, ty)
+        norm[norm == 0] = 1
+        tx /= norm
+        ty /= norm
+
+        normal, along = self.rng.normal(0, self.position_scale, size = (2, n))
+        along *= ALONG_TRACK
+        east[1:-1] += normal * -ty + along * tx
+        north[1:-1] += normal * tx + along * ty
+
+        return east, north
+
+    def paces(self, pace, n):
+        '''
+        n paces jittered around the given average pace.
+        '''
+
+        return pace + self.rng.normal(0, self.pace_scale, size = n)
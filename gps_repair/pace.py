@@ -0,0 +1,132 @@
+import numpy as np                            #Vectorized fitting and lookup
+import os
+
+from .detect import runs
+from .distance import cumulative_distances
+
+'''
+Grade-adjusted pace model: how much slower or faster than on
+the flat an athlete moves on each grade, fitted from the good
+part of an activity.
+'''
+
+#Lookup table grid
+GRADES = np.linspace(-0.3, 0.3, 61)           #rise over run, 1% steps
+GRADE_WINDOW = 10                             #records each grade is measured over
+MIN_RISE_DISTANCE = 5.0                       #metres, shorter windows give no grade
+FLAT = 0.02                                   #grades closer to 0 than this count as flat
+PRIOR_WEIGHT = 30                             #samples the prior is worth in each bin
+MIN_SAMPLES = 60                              #fewer moving samples and the prior is used as is
+
+def minetti_cost(grade):
+    '''
+    Energy cost of running in J/kg/m on a grade, from Minetti
+    et al. (2002).
+    '''
+
+    g = np.asarray(grade, dtype = np.float64)
+
+    return 155.4 * g**5 - 30.4 * g**4 - 43.3 * g**3 + 46.3 * g**2 + 19.5 * g + 3.6
+
+#Pace relative to the flat for a runner with no history
+PRIOR = minetti_cost(GRADES) / minetti_cost(0)
+
+def grades(distance, elevation):
+    '''
+    Grade of each segment of a track from the cumulative distance
+    and elevation at each point. NaN where either is missing or
+    the segment has no length.
+    '''
+
+    rise = np.diff(np.asarray(elevation, dtype = np.float64))
+    run = np.diff(np.asarray(distance, dtype = np.float64))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return np.where(run > 0, rise / run, np.nan)
+
+def fit_pace_table(lat, long, vel, elevation, good, min_speed):
+    '''
+    Fits the pace relative to the flat on each grade of GRADES
+    from the watch speed of the good records, shrunk towards the
+    PRIOR where there are few samples. Grades are measured over
+    GRADE_WINDOW records within each unbroken run of good records
+    and samples slower than min_speed are ignored.
+    '''
+
+    sample_grades = []
+    sample_paces = []
+    for start, end in runs(np.asarray(good, dtype = bool)):
+        if end - start <= GRADE_WINDOW:
+            continue
+
+        distance = cumulative_distances(lat[start:end], long[start:end])
+        rise = elevation[start + GRADE_WINDOW:end] - elevation[start:end - GRADE_WINDOW]
+        run = distance[GRADE_WINDOW:] - distance[:-GRADE_WINDOW]
+        speed = vel[start + GRADE_WINDOW // 2:end - GRADE_WINDOW + GRADE_WINDOW // 2]
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            keep = (run >= MIN_RISE_DISTANCE) & ~np.isnan(rise) & (speed >= min_speed)
+            sample_grades.append(rise[keep] / run[keep])
+            sample_paces.append(1 / speed[keep])
+
+    if not sample_grades or sum(len(g) for g in sample_grades) < MIN_SAMPLES:
+        return PRIOR.copy()
+
+    sample_grades = np.concatenate(sample_grades)
+    sample_paces = np.concatenate(sample_paces)
+
+    #Pace on the flat is the reference everything else is relative to
+    bins = np.clip(np.rint((sample_grades - GRADES[0]) / (GRADES[1] - GRADES[0])).astype(np.intp), 0, len(GRADES) - 1)
+    counts = np.bincount(bins, minlength = len(GRADES))
+    level = np.abs(sample_grades) < FLAT
+    flat = np.median(sample_paces[level] if level.any() else sample_paces)
+    relative = np.bincount(bins, weights = sample_paces / flat, minlength = len(GRADES))
+
+    return (relative + PRIOR_WEIGHT * PRIOR) / (counts + PRIOR_WEIGHT)
+
+def relative_paces(table, grade):
+    '''
+    Looks up the relative pace of each grade. Unknown grades
+    count as flat.
+    '''
+
+    return np.interp(np.nan_to_num(grade), GRADES, table)
+
+class PaceTables(object):
+    '''
+    Fitted pace tables by athlete and sport, kept in memory and,
+    given a directory, as .npy files so other processes and later
+    runs can reuse them.
+    '''
+
+    def __init__(self, directory = None):
+        self.directory = directory
+        self._tables = {}
+
+    def _path(self, athlete, sport):
+        return os.path.join(self.directory, "pace-{}-{}.npy".format(athlete, sport))
+
+    def get(self, athlete, sport):
+        '''
+        Returns the stored table, or None.
+        '''
+
+        table = self._tables.get((athlete, sport))
+        if table is None and self.directory is not None:
+            try:
+                table = np.load(self._path(athlete, sport))
+            except (OSError, ValueError):
+                return None
+            self._tables[(athlete, sport)] = table
+
+        return table
+
+    def put(self, athlete, sport, table):
+        self._tables[(athlete, sport)] = table
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok = True)
+
+            #Write then rename so readers never load half a table
+            path = self._path(athlete, sport)
+            scratch = "{}.{}.tmp.npy".format(path, os.getpid())
+            np.save(scratch, table)
+            os.replace(scratch, path)
@@ -0,0 +1,56 @@
+import numpy as np                            #Vectorized pause scan
+
+from .detect import implied_speed, runs
+
+'''
+Pause detection: splits the elapsed time of a record stream
+into moving time and the intervals spent stopped.
+'''
+
+#Thresholds for each sport
+#min_speed: m/s, anything slower counts as stopped
+#min_pause: seconds, shorter stops are treated as moving
+#max_gap: seconds, longer gaps between records with no progress are auto-pauses
+#max_speed: m/s, GPS implying anything faster is bad (see detect.py)
+SPORTS = {
+    "running": {"min_speed": 1.0, "min_pause": 3, "max_gap": 10, "max_speed": 12.0},
+    "walking": {"min_speed": 0.4, "min_pause": 5, "max_gap": 20, "max_speed": 6.0},
+    "hiking": {"min_speed": 0.3, "min_pause": 10, "max_gap": 30, "max_speed": 6.0},
+    "cycling": {"min_speed": 1.5, "min_pause": 3, "max_gap": 10, "max_speed": 30.0},
+}
+
+def detect_pauses(time, vel, lat, long, sport = "running"):
+    '''
+    Finds where a record stream was stopped, using the watch's
+    speed where it has one and the speed implied by the GPS
+    positions where it doesn't. Returns the moving time in
+    seconds and the pause intervals as (start, end) times in
+    the same units as time.
+    '''
+
+    thresholds = SPORTS[sport]
+    time = np.asarray(time, dtype = np.float64)
+    n = len(time)
+    if n < 2:
+        return 0.0, []
+
+    dt = np.diff(time)
+    implied = implied_speed(lat, long, time)
+
+    #Each segment takes the speed of the record it starts on
+    speed = np.asarray(vel, dtype = np.float64)[:-1]
+    speed = np.where(np.isnan(speed), implied, speed)
+
+    with np.errstate(invalid = "ignore"):
+        crawling = implied < thresholds["min_speed"]
+        stopped = (speed < thresholds["min_speed"]) | ((dt > thresholds["max_gap"]) & crawling)
+
+    #Stopped spans must last long enough to count as a pause
+    pauses = []
+    for start, end in runs(stopped):
+        if time[end] - time[start] >= thresholds["min_pause"]:
+            pauses.append((float(time[start]), float(time[end])))
+
+    paused = sum(end - start for start, end in pauses)
+
+    return float(time[-1] - time[0] - paused), pauses
@@ -0,0 +1,44 @@
+from .dem_index import DEMIndex
+
+'''
+Plots of repaired routes over their elevation profile.
+'''
+
+def plot_route(dem, final_lat, final_long, good_lat, good_long, route_lat, route_long, bad_lat, bad_long):
+    '''
+    Plots the final route over the elevation profile along
+    with the good, fixed and bad segments. The profile is left
+    out when dem isn't a DEMIndex or no tile is under the route.
+    '''
+
+    #Only pay for matplotlib when actually plotting
+    import matplotlib.pyplot as plt
+
+    #Only read the part of the first tile under the route, backends without tiles get no background
+    tiles = dem.tiles_for(final_lat, final_long) if isinstance(dem, DEMIndex) else []
+    if tiles:
+        sampler = dem.open(tiles[0])
+        rows, cols = sampler.pixels(final_lat, final_long)
+        row0, col0, nrows, ncols = sampler.bounding_window(rows, cols, pad = 50)
+        arr_ele = sampler.read_window(row0, col0, nrows, ncols)
+        x0 = sampler.x0 + sampler.dx * col0
+        y0 = sampler.y0 + sampler.dy * row0
+        x1 = x0 + sampler.dx * ncols
+        y1 = y0 + sampler.dy * nrows
+        plt.imshow(arr_ele, cmap = "inferno", extent = [x0, x1, y1, y0])
+
+    plt.plot(final_long, final_lat, c = "m")
+    plt.scatter(good_long, good_lat, c = "b")
+    plt.scatter(route_long, route_lat, c = "tab:olive")
+    plt.scatter(bad_long, bad_lat, c = "r")
+    plt.legend(["Final Route", "Good Segment", "Fixed Segment", "Bad Segment"])
+    plt.tick_params(
+        axis = "both",
+        which = "both",
+        bottom = False,
+        top = False,
+        right = False,
+        left = False,
+        labelleft = False,
+        labelbottom = False)
+    plt.show()
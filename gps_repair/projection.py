@@ -0,0 +1,113 @@
+import numpy as np                            #Vectorized coordinate transforms
+
+from .distance import TO_RADIANS
+
+'''
+Local east-north-up projection so track geometry can be done
+in metres with plain Euclidean math.
+'''
+
+#WGS84 ellipsoid
+A = 6378137.0
+F = 1 / 298.257223563
+E2 = F * (2 - F)
+B = A * (1 - F)
+EP2 = (A * A - B * B) / (B * B)
+
+def geodetic_to_ecef(lat, long, height = 0):
+    '''
+    Converts WGS84 lat/long in degrees and height in metres
+    to earth-centred earth-fixed x, y, z in metres.
+    '''
+
+    phi = np.asarray(lat, dtype = np.float64) * TO_RADIANS
+    lamb = np.asarray(long, dtype = np.float64) * TO_RADIANS
+    sin_phi = np.sin(phi)
+    n = A / np.sqrt(1 - E2 * sin_phi * sin_phi)
+
+    x = (n + height) * np.cos(phi) * np.cos(lamb)
+    y = (n + height) * np.cos(phi) * np.sin(lamb)
+    z = (n * (1 - E2) + height) * sin_phi
+
+    return x, y, z
+
+def ecef_to_geodetic(x, y, z):
+    '''
+    Converts earth-centred earth-fixed coordinates back to
+    WGS84 lat/long in degrees using Bowring's method.
+    '''
+
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * A, p * B)
+    phi = np.arctan2(z + EP2 * B * np.sin(theta)**3, p - E2 * A * np.cos(theta)**3)
+    lamb = np.arctan2(y, x)
+
+    return phi / TO_RADIANS, lamb / TO_RADIANS
+
+class LocalProjection(object):
+    '''
+    East-north-up tangent plane at an origin lat/long. Tracks
+    are converted to metres once, worked on with array math,
+    and converted back in bulk.
+    '''
+
+    def __init__(self, lat0, long0):
+        self.lat0 = float(lat0)
+        self.long0 = float(long0)
+        self.origin = np.array(geodetic_to_ecef(self.lat0, self.long0))
+
+        phi = self.lat0 * TO_RADIANS
+        lamb = self.long0 * TO_RADIANS
+
+        #Rows are the east, north and up unit vectors in ECEF
+        self.rotation = np.array([
+            [-np.sin(lamb), np.cos(lamb), 0],
+            [-np.sin(phi) * np.cos(lamb), -np.sin(phi) * np.sin(lamb), np.cos(phi)],
+            [np.cos(phi) * np.cos(lamb), np.cos(phi) * np.sin(lamb), np.sin(phi)],
+        ])
+
+    @classmethod
+    def for_track(cls, lat, long):
+        '''
+        Projection centred on the middle of a track's bounding box.
+        '''
+
+        lat = np.asarray(lat, dtype = np.float64)
+        long = np.asarray(long, dtype = np.float64)
+
+        return cls((lat.min() + lat.max()) / 2, (long.min() + long.max()) / 2)
+
+    def to_enu(self, lat, long):
+        '''
+        Converts lat/long in degrees on the ellipsoid surface to
+        east, north metres from the origin.
+        '''
+
+        ecef = np.array(geodetic_to_ecef(lat, long)).reshape(3, -1) - self.origin[:, None]
+        east, north, _ = self.rotation @ ecef
+
+        return east.reshape(np.shape(lat)), north.reshape(np.shape(lat))
+
+    def from_enu(self, east, north):
+        '''
+        Converts east, north metres back to lat/long in degrees,
+        dropping the points back onto the curved surface below
+        the tangent plane.
+        '''
+
+        east = np.asarray(east, dtype = np.float64)
+        north = np.asarray(north, dtype = np.float64)
+        up = -(east * east + north * north) / (2 * A)
+
+        enu = np.array([east.ravel(), north.ravel(), up.ravel()])
+        x, y, z = self.rotation.T @ enu + self.origin[:, None]
+        lat, long = ecef_to_geodetic(x, y, z)
+
+        return lat.reshape(east.shape), long.reshape(east.shape)
+
+def planar_distances(east, north):
+    '''
+    Length in metres of every segment of a projected track.
+    '''
+
+    return np.hypot(np.diff(east), np.diff(north))
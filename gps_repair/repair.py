@@ -0,0 +1,526 @@
+import numpy as np                            #Output arrays
+import fitparse, gpxpy                        #Parsing files
+import os
+
+from .cache import ParseCache
+from .backends import open_backend
+from .elevation_cache import CachedElevation, ElevationCache
+from .detect import detect_bad_intervals, interval_offsets
+from .fit_reader import merge_records, read_fit
+from .fit_writer import write_fit
+from .gpx_writer import write_gpx
+from .match import MIN_MATCHED, match_points
+from .metrics import Metrics
+from .noise import Noise
+from .pace import PaceTables, fit_pace_table, grades, relative_paces
+from .pauses import SPORTS, detect_pauses
+from .projection import LocalProjection, planar_distances
+from .resample import record_interval, resample_planar
+from .route import condition_route, parse_gpx
+from .track import Track
+
+'''
+Repairs the bad GPS segment of an activity using the actual
+route made on gmap-pedometer.
+'''
+
+#Constants
+TO_MILES = 1 / 1609.34
+TO_MINUTES = 1 / 60
+DEM_DIRECTORY = "data"
+
+class RepairResult(object):
+    '''
+    The repaired Track along with the good, fixed and bad
+    segments it was built from. lat, long, time, elevation and
+    midnight are those of the track. metrics holds the timings
+    of each stage of the repair.
+    '''
+
+    __slots__ = ("track", "good", "route", "bad", "metrics")
+
+    def __init__(self, track, good, route, bad, metrics = None):
+        self.track = track
+        self.good = good
+        self.route = route
+        self.bad = bad
+        self.metrics = metrics
+
+    @property
+    def lat(self):
+        return self.track.lat
+
+    @property
+    def long(self):
+        return self.track.long
+
+    @property
+    def time(self):
+        return self.track.time
+
+    @property
+    def elevation(self):
+        return self.track.elevation
+
+    @property
+    def midnight(self):
+        return self.track.midnight
+
+class Repairer(object):
+    '''
+    Repairs activities while keeping DEM tiles and parsed
+    routes warm between calls, so a long-lived process can
+    serve many repairs without paying startup each time.
+
+    resample puts fixed segments on a uniform time grid: a
+    number of seconds, or "record" for the activity's own
+    record interval. None keeps one point per route vertex.
+
+    With a seed, every repair() call draws the same noise, so
+    the same inputs always give the same output.
+
+    sport picks the pause and bad GPS thresholds, one of
+    pauses.SPORTS.
+
+    cache is a directory (or ParseCache) where parsed .fit and
+    .gpx files are kept between runs, and elevation_cache a
+    SQLite file (or ElevationCache) of elevations already
+    sampled, snapped to the DEM grid.
+
+    With match_route, the bad GPS points are snapped onto the
+    route and keep their own timestamps, falling back to the
+    average pace when too few of them are near the route.
+
+    The average pace is spread over the route by grade, using a
+    pace table fitted from the good records. Tables are kept per
+    athlete and sport when athlete is given, in the cache
+    directory if there is one, so later repairs skip the fit.
+
+    Every repair is timed stage by stage. trace_memory adds the
+    peak memory of each stage, and profile_stage runs one stage
+    (e.g. "fix" or "elevation") under cProfile.
+    '''
+
+    def __init__(self, dem = DEM_DIRECTORY, interpolation = "bilinear", plot = False,
+                 simplify_tolerance = None, route_spacing = None, resample = None, seed = None,
+                 sport = "running", cache = None, elevation_cache = None,
+                 match_route = False, athlete = None, trace_memory = False, profile_stage = None):
+        self.dem = open_backend(dem) if isinstance(dem, str) else dem
+        self.elevation = self.dem
+        if elevation_cache is not None:
+            if isinstance(elevation_cache, str):
+                elevation_cache = ElevationCache(elevation_cache)
+            self.elevation = CachedElevation(self.dem, elevation_cache)
+        self.interpolation = interpolation
+        self.plot = plot
+        self.simplify_tolerance = simplify_tolerance
+        self.route_spacing = route_spacing
+        self.resample = resample
+        self.seed = seed
+        self.sport = sport
+        self.match_route = match_route
+        self.athlete = athlete
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.cache = ParseCache(cache) if isinstance(cache, str) else cache
+        self.pace_tables = PaceTables(self.cache.directory if self.cache is not None else None)
+        self._routes = {}
+
+    def load_activity(self, activity):
+        '''
+        Reads an activity given as a .fit path or fitparse.FitFile,
+        or a list of them for an activity split over several
+        files. Returns the merged FitRecords, the sources and the
+        records of each file.
+        '''
+
+        sources = activity if isinstance(activity, (list, tuple)) else [activity]
+        records = [self._read_fit(source) for source in sources]
+
+        return merge_records(records) if len(records) > 1 else records[0], sources, records
+
+    def _read_fit(self, source):
+        if not isinstance(source, str):
+            return read_fit(source)
+        if self.cache is not None:
+            return self.cache.load_fit(source)
+
+        return read_fit(fitparse.FitFile(source))
+
+    def load_route(self, route):
+        '''
+        Parses a route .gpx path or gpxpy.gpx, reusing routes
+        already parsed unless the file has changed since.
+        '''
+
+        if not isinstance(route, str):
+            return parse_gpx(route)
+
+        key = os.path.abspath(route)
+        mtime = os.path.getmtime(route)
+        cached = self._routes.get(key)
+        if cached is None or cached[0] != mtime:
+            if self.cache is not None:
+                cached = (mtime,) + self.cache.load_gpx(route)
+            else:
+                with open(route, "r") as f:
+                    cached = (mtime,) + parse_gpx(gpxpy.parse(f))
+            self._routes[key] = cached
+
+        return cached[1], cached[2]
+
+    def bad_intervals(self, records, parts, bad_interval):
+        '''
+        Resolves the bad_interval argument of repair() to a sorted
+        list of (start, end) record offsets, end exclusive.
+        '''
+
+        if bad_interval is None and len(parts) == 1:
+            #Leaving it out only makes sense for a split activity
+            raise ValueError('A bad interval, or "auto", is needed to repair a single file')
+
+        if bad_interval is None:
+            #The first file of a split activity is the bad one
+            offsets = [(0, len(parts[0]))]
+        else:
+            if bad_interval == "auto":
+                intervals = detect_bad_intervals(records, SPORTS[self.sport]["max_speed"])
+                if not intervals:
+                    raise ValueError("No bad GPS segment detected")
+            elif isinstance(bad_interval[0], (list, tuple)):
+                intervals = bad_interval
+            else:
+                intervals = [bad_interval]
+            offsets = [interval_offsets(records.time, interval) for interval in intervals]
+
+        offsets.sort()
+        for (_, end), (start, _) in zip(offsets, offsets[1:]):
+            if start < end:
+                raise ValueError("Bad intervals overlap")
+
+        return offsets
+
+    def pace_table(self, records, good, elevation):
+        '''
+        Returns the athlete's stored pace table, or fits one from
+        the good records. elevation is a function returning the
+        elevation of every record (NaN outside good), only called
+        when a table has to be fitted.
+        '''
+
+        if self.athlete is not None:
+            table = self.pace_tables.get(self.athlete, self.sport)
+            if table is not None:
+                return table
+
+        table = fit_pace_table(records.lat, records.long, records.vel, elevation(), good, SPORTS[self.sport]["min_speed"])
+
+        if self.athlete is not None:
+            self.pace_tables.put(self.athlete, self.sport, table)
+
+        return table
+
+    def fix_segment(self, records, start_bad, end_bad, route_lat, route_long, noise, interval = None,
+                    pace_table = None):
+        '''
+        Builds the fixed segment replacing records[start_bad:end_bad]
+        from the route, returning it as a Track.
+        The geometry is done in metres in a local east-north plane
+        around the route, and the segment is put on a grid every
+        interval seconds when one is given. With a pace_table the
+        pace varies with the grade of the route; it may also be a
+        function returning the table, called only when the segment
+        is paced rather than matched.
+        '''
+
+        n = len(records)
+        route_lat = np.array(route_lat, dtype = np.float64)
+        route_long = np.array(route_long, dtype = np.float64)
+
+        #Set starting/ending point of route to ending/starting point of good data
+        if start_bad != 0 and end_bad != n:
+            route_lat[0] = records.lat[start_bad - 1]
+            route_long[0] = records.long[start_bad - 1]
+        if end_bad != n:
+            route_lat[-1] = records.lat[end_bad]
+            route_long[-1] = records.long[end_bad]
+
+        #Work in metres from here on
+        projection = LocalProjection.for_track(route_lat, route_long)
+        east, north = projection.to_enu(route_lat, route_long)
+
+        timed = None
+        if self.match_route:
+            timed = self._matched_timing(records, start_bad, end_bad, projection, east, north, noise)
+        if timed is None:
+            effort = None
+            if callable(pace_table):
+                pace_table = pace_table()
+            if pace_table is not None:
+                elevation = self.elevation.sample(route_lat, route_long, self.interpolation)
+                arc = np.concatenate(([0], np.cumsum(planar_distances(east, north))))
+                effort = relative_paces(pace_table, grades(arc, elevation))
+            timed = self._paced_timing(records, start_bad, end_bad, east, north, noise, effort)
+        east, north, route_time = timed
+
+        #Match the device's record rate instead of one point per route vertex
+        if interval is not None:
+            east, north, route_time = resample_planar(east, north, route_time, interval)
+
+        route_lat, route_long = projection.from_enu(east, north)
+
+        return Track.from_columns(route_lat, route_long, route_time, date = records.date, midnight = records.midnight)
+
+    def _paced_timing(self, records, start_bad, end_bad, east, north, noise, effort = None):
+        '''
+        Times the route at the average pace of the bad segment's
+        moving time, stopping for each of its pauses. effort is the
+        relative pace of each route segment, flat when None.
+        '''
+
+        bad_time = records.time[start_bad:end_bad]
+
+        #Split the bad time into moving time and pauses
+        bad_time_tot, pauses = detect_pauses(bad_time, records.vel[start_bad:end_bad],
+                                             records.lat[start_bad:end_bad], records.long[start_bad:end_bad],
+                                             self.sport)
+
+        #Add noise to the route, skipping the start/end points
+        east, north = noise.perturb_route(east, north)
+
+        #Now calculate the real total distance of the route in one pass
+        route_segments = planar_distances(east, north) * TO_MILES
+        route_distance = route_segments.sum()
+
+        #Calculate the average pace of the new route
+        tot_pace = (bad_time_tot * TO_MINUTES) / route_distance
+
+        #Jitter the pace, weight it by grade, then rescale so the moving time comes out exact
+        paces = noise.paces(tot_pace, len(route_segments))
+        if effort is not None:
+            paces *= effort
+        paces *= bad_time_tot * TO_MINUTES / (paces * route_segments).sum()
+
+        #Calculate route times to match avg pace with some noise
+        route_time = np.empty(len(east))
+        route_time[0] = bad_time[0]
+        np.cumsum(paces * route_segments / TO_MINUTES, out = route_time[1:])
+        route_time[1:] += bad_time[0]
+
+        #Stop on the route for each pause, after as much moving time as it took originally
+        if pauses:
+            start, end = np.array(pauses).T
+            duration = end - start
+            before = np.cumsum(duration) - duration
+            arrive = start - before
+            index = np.searchsorted(route_time, arrive, side = "right")
+
+            stop_east = np.interp(arrive, route_time, east)
+            stop_north = np.interp(arrive, route_time, north)
+
+            #Everything after a stop is pushed back by its duration
+            shift = np.zeros(len(route_time) + 1)
+            np.add.at(shift, index, duration)
+            route_time = route_time + np.cumsum(shift)[:-1]
+
+            index = np.repeat(index, 2)
+            east = np.insert(east, index, np.repeat(stop_east, 2))
+            north = np.insert(north, index, np.repeat(stop_north, 2))
+            route_time = np.insert(route_time, index, np.column_stack((start, end)).ravel())
+
+        return east, north, route_time
+
+    def _matched_timing(self, records, start_bad, end_bad, projection, east, north, noise):
+        '''
+        Times the route from the bad GPS points themselves, snapped
+        onto it with their real timestamps. The route spans the
+        whole bad segment even when its first or last points are
+        off the route. Returns None when too few of them are near
+        the route to be trusted.
+        '''
+
+        bad_time = records.time[start_bad:end_bad]
+        x, y = projection.to_enu(records.lat[start_bad:end_bad], records.long[start_bad:end_bad])
+        arc = match_points(east, north, x, y)
+        matched = ~np.isnan(arc)
+        if matched.sum() < max(2, MIN_MATCHED * len(arc)):
+            return None
+
+        #Route vertices get their times from the snapped points around them, with the
+        #ends of the route pinned to the ends of the bad segment so unmatched stretches
+        #there are covered at their own average pace
+        vertex_arc = np.concatenate(([0], np.cumsum(planar_distances(east, north))))
+        vertex_time = np.interp(vertex_arc, np.concatenate(([0], arc[matched], vertex_arc[-1:])),
+                                np.concatenate((bad_time[:1], bad_time[matched], bad_time[-1:])))
+        vertex_time[0] = bad_time[0]
+        vertex_time[-1] = bad_time[-1]
+        arc = np.concatenate((vertex_arc, arc[matched]))
+        route_time = np.concatenate((vertex_time, bad_time[matched]))
+        order = np.lexsort((route_time, arc))
+        arc = arc[order]
+        route_time = route_time[order]
+
+        east, north = noise.perturb_route(np.interp(arc, vertex_arc, east), np.interp(arc, vertex_arc, north))
+
+        return east, north, route_time
+
+    def repair(self, activity, route, bad_interval = None, output_path = None, fit_output_path = None):
+        '''
+        Repairs the bad segments of an activity with the actual route.
+
+        bad_interval is (start, end) in seconds from the start of
+        the activity, 0 for the start and -1 for the end, or a list
+        of them with one route each, or "auto" to use the intervals
+        found by detect_bad_intervals. When the activity is split
+        over several files and no interval is given, the first
+        file is the bad one; a single file needs an interval. The
+        result is written to output_path
+        (.gpx) and fit_output_path (.fit) when given, and returned
+        as a RepairResult whose metrics time each stage.
+        '''
+
+        #Profile stats go next to the output so batch jobs don't overwrite each other
+        profile_path = None
+        if self.profile_stage is not None and output_path is not None:
+            profile_path = "{}.{}.prof".format(os.path.splitext(output_path)[0], self.profile_stage)
+
+        metrics = Metrics(self.trace_memory, self.profile_stage, profile_path)
+        try:
+            return self._repair(activity, route, bad_interval, output_path, fit_output_path, metrics)
+        finally:
+            metrics.close()
+
+    def _repair(self, activity, route, bad_interval, output_path, fit_output_path, metrics):
+        with metrics.stage("parse") as stage:
+            records, files, parts = self.load_activity(activity)
+            stage["points"] = len(records)
+
+        with metrics.stage("intervals", len(records)):
+            offsets = self.bad_intervals(records, parts, bad_interval)
+
+        routes = route if isinstance(route, (list, tuple)) else [route]
+        if len(routes) != len(offsets):
+            raise ValueError("Got {} routes for {} bad intervals".format(len(routes), len(offsets)))
+
+        n = len(records)
+        good = np.ones(n, dtype = bool)
+        for start_bad, end_bad in offsets:
+            good[start_bad:end_bad] = False
+
+        #The good records are sampled at most once, for the pace table and the output
+        elevation = np.full(n, np.nan)
+        state = {"sampled": False, "table": None}
+
+        def good_elevation():
+            if not state["sampled"]:
+                with metrics.stage("elevation", int(good.sum())):
+                    if good.any():
+                        elevation[good] = self.elevation.sample(records.lat[good], records.long[good], self.interpolation)
+                state["sampled"] = True
+            return elevation
+
+        #Only fitted once a segment turns out to need it, as a stage nested in "fix"
+        def table():
+            if state["table"] is None:
+                with metrics.stage("pace_table", n):
+                    state["table"] = self.pace_table(records, good, good_elevation)
+            return state["table"]
+
+        #Fix each bad segment with its own route
+        noise = Noise(self.seed)
+        interval = record_interval(records.time) if self.resample == "record" else self.resample
+        fixed = []
+        for (start_bad, end_bad), route in zip(offsets, routes):
+            with metrics.stage("route") as stage:
+                route_lat, route_long = self.load_route(route)
+
+                #Remove duplicate points, then simplify/densify the route if asked to
+                route_lat, route_long = condition_route(route_lat, route_long, self.simplify_tolerance, self.route_spacing)
+                stage["points"] = len(route_lat)
+
+            with metrics.stage("fix") as stage:
+                fixed.append(self.fix_segment(records, start_bad, end_bad, route_lat, route_long, noise, interval, table))
+                stage["points"] = len(fixed[-1])
+
+        #Splice good rows and fixed segments into one preallocated track
+        size = n - sum(end - start for start, end in offsets) + sum(len(segment) for segment in fixed)
+        with metrics.stage("splice", size):
+            final = Track.empty(size, records.date, records.midnight)
+            fixed_rows = np.zeros(size, dtype = bool)
+            positions = []
+
+            k = 0
+            previous = 0
+            for (start_bad, end_bad), segment in zip(offsets, fixed):
+                #Good data before this segment
+                m = start_bad - previous
+                final.data[k:k + m] = records.data[previous:start_bad]
+                k += m
+
+                #The fixed segment goes where the bad one was
+                m = len(segment)
+                final.data[k:k + m] = segment.data
+                fixed_rows[k:k + m] = True
+                positions.append(k)
+                k += m
+
+                previous = end_bad
+
+            final.data[k:] = records.data[previous:]
+
+        #Sample the full resolution tiles for the whole route at once, reusing the good
+        #records' elevations when the pace table already needed them
+        #Points off every tile come back as NaN and are left out of the output
+        if state["sampled"]:
+            final.elevation[~fixed_rows] = elevation[good]
+            with metrics.stage("elevation", int(fixed_rows.sum())):
+                final.elevation[fixed_rows] = self.elevation.sample(final.lat[fixed_rows], final.long[fixed_rows],
+                                                                    self.interpolation)
+        else:
+            with metrics.stage("elevation", size):
+                final.elevation[:] = self.elevation.sample(final.lat, final.long, self.interpolation)
+
+        route_lat = np.concatenate([segment.lat for segment in fixed])
+        route_long = np.concatenate([segment.long for segment in fixed])
+        result = RepairResult(final,
+                              (records.lat[good], records.long[good]),
+                              (route_lat, route_long),
+                              (records.lat[~good], records.long[~good]),
+                              metrics)
+
+        #Plot elevation profile
+        if self.plot:
+            from .plot import plot_route
+            with metrics.stage("plot", size):
+                plot_route(self.dem, final.lat, final.long, result.good[0], result.good[1],
+                           route_lat, route_long, result.bad[0], result.bad[1])
+
+        #Finally write to new .gpx file
+        if output_path is not None:
+            with metrics.stage("gpx", size):
+                write_gpx(output_path, final)
+
+        #Splice the fixed segments back into the record stream of every file
+        if fit_output_path is not None:
+            #Views of the spliced track, which has the elevations
+            segments = [final[k:k + len(segment)] for k, segment in zip(positions, fixed)]
+            with metrics.stage("fit", size):
+                sources = [fitparse.FitFile(source) if isinstance(source, str) else source for source in files]
+                write_fit(fit_output_path, sources, segments)
+
+        return result
+
+#Shared by calls to repair() so tiles and routes stay warm
+_default = None
+
+def repair(activity, route, bad_interval = None, output_path = None, fit_output_path = None):
+    '''
+    Repairs the bad segments of an activity with the route using
+    a shared Repairer. See Repairer.repair.
+    '''
+
+    global _default
+    if _default is None:
+        _default = Repairer()
+
+    return _default.repair(activity, route, bad_interval, output_path, fit_output_path)
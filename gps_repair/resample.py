@@ -0,0 +1,50 @@
+import numpy as np                            #Batch interpolation
+
+from .projection import planar_distances
+
+'''
+Resampling of fixed segments onto a uniform time grid.
+'''
+
+def record_interval(time):
+    '''
+    The device's usual time between records, taken as the
+    median gap between timestamps.
+    '''
+
+    gaps = np.diff(np.asarray(time, dtype = np.float64))
+    gaps = gaps[gaps > 0]
+
+    return float(np.median(gaps)) if len(gaps) else 1.0
+
+def _time_grid(time, interval):
+    grid = np.arange(time[0], time[-1], interval)
+    if not len(grid) or grid[-1] < time[-1]:
+        grid = np.append(grid, time[-1])
+
+    return grid
+
+def resample_planar(east, north, time, interval):
+    '''
+    Resamples a track projected to metres onto a uniform time
+    grid every interval seconds, from its first to its last
+    timestamp. Positions move at constant speed along each
+    original segment, using the cumulative distance along the
+    track.
+    '''
+
+    east = np.asarray(east, dtype = np.float64)
+    north = np.asarray(north, dtype = np.float64)
+    time = np.asarray(time, dtype = np.float64)
+    if len(time) < 2:
+        return east, north, time
+
+    #Interpolation needs time to never run backwards
+    time = np.maximum.accumulate(time)
+    distance = np.concatenate(([0], np.cumsum(planar_distances(east, north))))
+
+    #Distance travelled at each grid time, then the position at that distance
+    grid = _time_grid(time, interval)
+    grid_distance = np.interp(grid, time, distance)
+
+    return np.interp(grid_distance, distance, east), np.interp(grid_distance, distance, north), grid
@@ -0,0 +1,134 @@
+import numpy as np                            #Vectorized route conditioning
+
+from .distance import R, TO_RADIANS, segment_distances
+
+'''
+Planned routes made on gmap-pedometer, and conditioning them
+into a predictable number of points before the repair.
+'''
+
+def parse_gpx(file):
+    '''
+    Parses the data from a gpxpy.gpx for the
+    longitude and latitude between polls.
+    '''
+
+    points = file.routes[0].points
+
+    #Grab lat, long
+    lat = np.fromiter((point.latitude for point in points), dtype = np.float64, count = len(points))
+    long = np.fromiter((point.longitude for point in points), dtype = np.float64, count = len(points))
+
+    return lat, long
+
+def remove_duplicates(lat, long):
+    '''
+    Drops points identical to the one before them.
+    '''
+
+    lat = np.asarray(lat, dtype = np.float64)
+    long = np.asarray(long, dtype = np.float64)
+
+    keep = np.ones(len(lat), dtype = bool)
+    keep[1:] = (lat[1:] != lat[:-1]) | (long[1:] != long[:-1])
+
+    return lat[keep], long[keep]
+
+def _local_metres(lat, long):
+    '''
+    Equirectangular x/y in metres around the route's mean
+    latitude, plenty accurate over the length of a route.
+    '''
+
+    lat0 = lat.mean() * TO_RADIANS
+    x = (long - long[0]) * TO_RADIANS * R * np.cos(lat0)
+    y = (lat - lat[0]) * TO_RADIANS * R
+
+    return x, y
+
+def simplify(lat, long, tolerance):
+    '''
+    Douglas-Peucker simplification keeping every point that
+    deviates more than tolerance metres from the simplified
+    line. Distances for each span are computed in one go.
+    '''
+
+    lat = np.asarray(lat, dtype = np.float64)
+    long = np.asarray(long, dtype = np.float64)
+    n = len(lat)
+    if n < 3:
+        return lat, long
+
+    x, y = _local_metres(lat, long)
+    keep = np.zeros(n, dtype = bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        #Distance of every interior point to the chord between first and last
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        length = dx * dx + dy * dy
+        if length > 0:
+            t = np.clip((px * dx + py * dy) / length, 0, 1)
+            dist = np.hypot(px - t * dx, py - t * dy)
+        else:
+            dist = np.hypot(px, py)
+
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return lat[keep], long[keep]
+
+def densify(lat, long, spacing):
+    '''
+    Splits every segment longer than spacing metres into equal
+    pieces no longer than spacing, keeping the original
+    vertices so corners stay put.
+    '''
+
+    lat = np.asarray(lat, dtype = np.float64)
+    long = np.asarray(long, dtype = np.float64)
+    if len(lat) < 2:
+        return lat, long
+
+    pieces = np.maximum(np.ceil(segment_distances(lat, long) / spacing).astype(np.intp), 1)
+
+    #Fraction along its segment of every output point
+    segment = np.repeat(np.arange(len(pieces)), pieces)
+    starts = np.cumsum(pieces) - pieces
+    fraction = (np.arange(pieces.sum()) - starts[segment]) / pieces[segment]
+
+    new_lat = np.empty(len(segment) + 1)
+    new_long = np.empty(len(segment) + 1)
+    new_lat[:-1] = lat[segment] + (lat[segment + 1] - lat[segment]) * fraction
+    new_long[:-1] = long[segment] + (long[segment + 1] - long[segment]) * fraction
+    new_lat[-1] = lat[-1]
+    new_long[-1] = long[-1]
+
+    return new_lat, new_long
+
+def condition_route(lat, long, tolerance = None, spacing = None):
+    '''
+    Removes duplicate points, then optionally simplifies the
+    route to tolerance metres and densifies it to spacing
+    metres.
+    '''
+
+    lat, long = remove_duplicates(lat, long)
+    if tolerance:
+        lat, long = simplify(lat, long, tolerance)
+    if spacing:
+        lat, long = densify(lat, long, spacing)
+
+    return lat, long
@@ -0,0 +1,99 @@
+import numpy as np                            #One structured array per track
+
+'''
+Compact track representation shared by parsing, splicing,
+elevation sampling and writing.
+'''
+
+#One row per point, 40 bytes each
+TRACK_DTYPE = np.dtype([("lat", np.float64),          #degrees
+                        ("long", np.float64),         #degrees
+                        ("time", np.float64),         #seconds since midnight
+                        ("vel", np.float64),          #m/s, NaN when not logged
+                        ("elevation", np.float64)])   #metres, NaN when unknown
+
+class Track(object):
+    '''
+    Points of a track held in a single structured array of
+    TRACK_DTYPE. lat, long, time, vel and elevation are views of
+    its fields, and slicing a Track gives a Track viewing the
+    same buffer, so stages pass points along without copying.
+    time is in seconds since midnight (unix epoch seconds) of
+    the activity date.
+    '''
+
+    __slots__ = ("data", "date", "midnight")
+
+    def __init__(self, data, date = None, midnight = 0):
+        self.data = data
+        self.date = date
+        self.midnight = midnight
+
+    @classmethod
+    def empty(cls, n, date = None, midnight = 0):
+        '''
+        A track of n points to be filled in, with unknown speed
+        and elevation.
+        '''
+
+        data = np.empty(n, dtype = TRACK_DTYPE)
+        data["vel"] = np.nan
+        data["elevation"] = np.nan
+
+        return cls(data, date, midnight)
+
+    @classmethod
+    def from_columns(cls, lat, long, time, vel = None, elevation = None, date = None, midnight = 0):
+        '''
+        Packs separate columns into a track. Missing speed and
+        elevation are NaN.
+        '''
+
+        track = cls.empty(len(lat), date, midnight)
+        track.data["lat"] = lat
+        track.data["long"] = long
+        track.data["time"] = time
+        if vel is not None:
+            track.data["vel"] = vel
+        if elevation is not None:
+            track.data["elevation"] = elevation
+
+        return track
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        '''
+        Slices are views, masks and index arrays copy.
+        '''
+
+        return Track(self.data[index], self.date, self.midnight)
+
+    @property
+    def lat(self):
+        return self.data["lat"]
+
+    @property
+    def long(self):
+        return self.data["long"]
+
+    @property
+    def time(self):
+        return self.data["time"]
+
+    @property
+    def vel(self):
+        return self.data["vel"]
+
+    @property
+    def elevation(self):
+        return self.data["elevation"]
+
+    @property
+    def epoch(self):
+        '''
+        Unix timestamps of the points.
+        '''
+
+        return self.time + self.midnight
@@ -0,0 +1,31 @@
+import os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic import make_case
+
+from helpers import SlopeDEM
+
+'''
+Shared fixtures: the synthetic activities from the benchmarks
+and an elevation backend that needs no DEM tiles.
+'''
+
+@pytest.fixture
+def dem():
+    return SlopeDEM()
+
+@pytest.fixture(scope = "session")
+def case(tmp_path_factory):
+    '''
+    A 2000 point synthetic activity with its route, returning
+    the directory and the bad interval in seconds.
+    '''
+
+    directory = str(tmp_path_factory.mktemp("case"))
+
+    return directory, make_case(directory, 2000)
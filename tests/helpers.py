@@ -0,0 +1,28 @@
+import numpy as np                            #Stand-in elevations
+import os
+
+'''
+Helpers shared by the tests.
+'''
+
+class SlopeDEM(object):
+    '''
+    Elevation backend of a plane rising to the north, so tests
+    run without GDAL or tiles.
+    '''
+
+    name = "slope"
+
+    def sample(self, lat, long, method = "bilinear"):
+        return 1600 + (np.asarray(lat, dtype = np.float64) - 40.0) * 10000
+
+    def close(self):
+        pass
+
+class CrashingDEM(SlopeDEM):
+    '''
+    Kills the process sampling it, like a segfault in GDAL.
+    '''
+
+    def sample(self, lat, long, method = "bilinear"):
+        os._exit(1)
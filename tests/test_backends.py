@@ -0,0 +1,132 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from urllib.parse import parse_qs, urlsplit
+import asyncio, json, os, threading
+
+import numpy as np
+import pytest
+
+from gps_repair import Repairer, backends
+from gps_repair.backends import RemoteElevation
+
+class ElevationHandler(BaseHTTPRequestHandler):
+    '''
+    EPQS stand-in: answers 503 to the first request for each
+    point, then its elevation, or the nodata value north of 40.5.
+    '''
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        point = (query["y"][0], query["x"][0])
+        with self.server.lock:
+            self.server.hits[point] += 1
+            first = self.server.hits[point] == 1
+
+        if first:
+            status, body = 503, b"busy"
+        else:
+            lat, long = float(point[0]), float(point[1])
+            value = backends.EPQS_NODATA if lat > 40.5 else lat * 100 + long
+            status, body = 200, json.dumps({"value": value}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(backends, "BACKOFF", 0.01)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ElevationHandler)
+    httpd.hits = Counter()
+    httpd.lock = threading.Lock()
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def url(server):
+    return "http://127.0.0.1:{}/v1/json?x={{long}}&y={{lat}}".format(server.server_address[1])
+
+def test_dedupe_and_retry(server):
+    lat = np.array([40.0, 40.1, 40.0, 40.1, 40.9])
+    long = np.array([-105.0, -105.1, -105.0, -105.1, -105.0])
+    remote = RemoteElevation(url(server), concurrency = 4, rate = 1000)
+    try:
+        values = remote.sample(lat, long)
+    finally:
+        remote.close()
+
+    np.testing.assert_allclose(values[:4], lat[:4] * 100 + long[:4])
+    assert np.isnan(values[4])
+
+    #Each distinct point is asked for once, plus once more after its 503
+    assert len(server.hits) == 3
+    assert all(count == 2 for count in server.hits.values())
+
+def test_rate_limit_spans_calls(server):
+    '''
+    Back to back sample() calls don't each start with a fresh
+    allowance.
+    '''
+
+    remote = RemoteElevation(url(server), rate = 5)
+    start = perf_counter()
+    try:
+        for i in range(3):
+            remote.sample([40.0 + i / 10], [-105.0])
+    finally:
+        remote.close()
+
+    #Two requests per point with the 503, 1 / 5 s apart
+    assert perf_counter() - start >= 1.0
+    assert remote.shared(4).rate == 1.25
+
+def test_sample_in_running_loop(server):
+    remote = RemoteElevation(url(server), rate = 1000)
+
+    async def both():
+        return remote.sample([40.0], [-105.0]), await remote.sample_async([40.1], [-105.1])
+
+    try:
+        blocking, awaited = asyncio.run(both())
+    finally:
+        remote.close()
+
+    np.testing.assert_allclose(blocking, [40.0 * 100 - 105.0])
+    np.testing.assert_allclose(awaited, [40.1 * 100 - 105.1])
+
+@pytest.fixture
+def no_show(monkeypatch):
+    import matplotlib
+    matplotlib.use("Agg")
+
+@pytest.mark.usefixtures("no_show")
+def test_plot_without_tiles(case, dem):
+    '''
+    Backends with no tiles, remote ones included, plot without
+    the elevation background instead of failing.
+    '''
+
+    directory, interval = case
+    result = Repairer(dem, plot = True, seed = 0).repair(os.path.join(directory, "activity.fit"),
+                                                       os.path.join(directory, "route.gpx"), interval)
+
+    assert len(result.lat)
+
+@pytest.mark.usefixtures("no_show")
+def test_plot_with_no_tile_under_route(case, tmp_path):
+    pytest.importorskip("osgeo")
+
+    directory, interval = case
+    result = Repairer(str(tmp_path), plot = True, seed = 0).repair(os.path.join(directory, "activity.fit"),
+                                                                 os.path.join(directory, "route.gpx"), interval)
+
+    assert np.isnan(result.elevation).all()
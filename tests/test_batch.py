@@ -0,0 +1,33 @@
+import os
+
+import batch
+from helpers import CrashingDEM
+
+def test_dead_worker_fails_its_jobs(case, tmp_path):
+    '''
+    A worker dying fails the jobs it takes down instead of
+    aborting the batch.
+    '''
+
+    directory, interval = case
+    jobs = [{"fit": os.path.join(directory, "activity.fit"),
+             "route": os.path.join(directory, "route.gpx"),
+             "interval": interval,
+             "output": str(tmp_path / "{}.gpx".format(i))} for i in range(3)]
+
+    results = list(batch.run_batch(jobs, CrashingDEM(), 1))
+
+    assert len(results) == 3
+    assert all(result["error"].startswith("BrokenProcessPool") for result in results)
+
+def test_scan_skips_repaired_outputs(tmp_path):
+    '''
+    Outputs of an earlier --fit run are not picked up as jobs.
+    '''
+
+    for name in ("run.FIT", "run.gpx", "run_repaired.fit", "run_repaired.gpx"):
+        (tmp_path / name).write_bytes(b"")
+
+    jobs = batch.scan_directory(str(tmp_path), None, "auto")
+
+    assert [os.path.basename(job["fit"]) for job in jobs] == ["run.FIT"]
@@ -0,0 +1,71 @@
+import os
+
+import fitparse
+import numpy as np
+import pytest
+
+from synthetic import ORIGIN
+
+from gps_repair import Repairer
+from gps_repair.detect import detect_bad_intervals
+from gps_repair.fit_reader import read_fit
+from gps_repair.pauses import SPORTS
+from gps_repair.projection import LocalProjection
+from gps_repair.track import Track
+
+def test_one_interval_on_synthetic_case(case):
+    '''
+    3 m of jitter on the good records is not mistaken for bad
+    GPS, and the single bad stretch comes back as one interval.
+    '''
+
+    directory, (start_bad, end_bad) = case
+    records = read_fit(fitparse.FitFile(os.path.join(directory, "activity.fit")))
+
+    intervals = detect_bad_intervals(records)
+    assert len(intervals) == 1
+    start, end = intervals[0]
+    assert abs(start - start_bad) <= 10
+    assert abs(end - end_bad) <= 10
+
+def test_auto_repair_with_one_route(case, dem):
+    directory, _ = case
+    result = Repairer(dem, seed = 0).repair(os.path.join(directory, "activity.fit"),
+                                            os.path.join(directory, "route.gpx"), "auto")
+
+    assert len(result.route[0]) > 0
+
+def test_single_file_needs_an_interval(case, dem):
+    '''
+    Without an interval a single file is not taken as all bad.
+    '''
+
+    directory, _ = case
+    with pytest.raises(ValueError):
+        Repairer(dem, seed = 0).repair(os.path.join(directory, "activity.fit"),
+                                       os.path.join(directory, "route.gpx"))
+
+def test_cycling_speeds_are_not_bad_gps(dem):
+    '''
+    A steady 14 m/s ride is too fast for a runner but not for
+    the cycling thresholds.
+    '''
+
+    rng = np.random.default_rng(0)
+    n = 600
+    north = np.arange(n) * 14.0 + rng.normal(0, 3, n)
+    east = rng.normal(0, 3, n)
+    lat, long = LocalProjection(*ORIGIN).from_enu(east, north)
+    records = Track.from_columns(lat, long, np.arange(n, dtype = np.float64), np.full(n, 14.0))
+
+    assert detect_bad_intervals(records, SPORTS["cycling"]["max_speed"]) == []
+    assert detect_bad_intervals(records) == [(0, -1)]
+    with pytest.raises(ValueError, match = "No bad GPS"):
+        Repairer(dem, sport = "cycling").bad_intervals(records, [records], "auto")
+
+def test_reversed_interval(case, dem):
+    directory, _ = case
+    records = read_fit(fitparse.FitFile(os.path.join(directory, "activity.fit")))
+
+    with pytest.raises(ValueError, match = "ends before it starts"):
+        Repairer(dem).bad_intervals(records, [records], (1800, 1200))
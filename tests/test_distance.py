@@ -0,0 +1,45 @@
+from math import atan2, cos, sin, sqrt
+import numpy as np
+
+from gps_repair.distance import R, TO_RADIANS, cumulative_distances, haversine, segment_distances
+
+def scalar_distance(lat, long):
+    '''
+    The per-pair haversine the scripts used before the
+    vectorized module.
+    '''
+
+    psi1 = lat[0] * TO_RADIANS
+    psi2 = lat[1] * TO_RADIANS
+    del_psi = (lat[1] - lat[0]) * TO_RADIANS
+    del_lamb = (long[1] - long[0]) * TO_RADIANS
+
+    a = sin(del_psi / 2)**2 + cos(psi1) * cos(psi2) * sin(del_lamb / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    return R * c
+
+def track(n = 1000, seed = 0):
+    rng = np.random.default_rng(seed)
+    lat = 40 + np.cumsum(rng.normal(0, 1e-4, size = n))
+    long = -75 + np.cumsum(rng.normal(0, 1e-4, size = n))
+
+    return lat, long
+
+def test_segments_match_scalar_distance():
+    lat, long = track()
+    expected = [scalar_distance(lat[i:i + 2], long[i:i + 2]) for i in range(len(lat) - 1)]
+
+    np.testing.assert_allclose(segment_distances(lat, long), expected, rtol = 0, atol = 1e-6)
+
+def test_haversine_accepts_scalars():
+    assert abs(haversine(40, -75, 40.001, -75) - scalar_distance([40, 40.001], [-75, -75])) < 1e-6
+    assert haversine(40, -75, 40, -75) == 0
+
+def test_cumulative_distances():
+    lat, long = track()
+    cumulative = cumulative_distances(lat, long)
+
+    assert cumulative[0] == 0
+    assert len(cumulative) == len(lat)
+    np.testing.assert_allclose(np.diff(cumulative), segment_distances(lat, long))
@@ -0,0 +1,56 @@
+import numpy as np
+
+import pytest
+
+from gps_repair.elevation import _bicubic, _bilinear, _nearest
+from gps_repair.elevation_cache import CachedElevation, ElevationCache
+
+class RasterDEM(object):
+    '''
+    In-memory north-up raster sampled the way ElevationSampler
+    samples a tile, at 1/9 arc-second like the ned19 tiles.
+    '''
+
+    name = "raster"
+
+    def __init__(self, rows = 200, cols = 200, west = -105.01, north = 40.01, pixel = 1 / 32400):
+        y = np.arange(rows)[:, None] * pixel
+        x = np.arange(cols)[None, :] * pixel
+        self.values = 1600 + 50 * np.sin(x * 9000) * np.cos(y * 7000) + 0.01 * np.arange(rows * cols).reshape(rows, cols)
+        self.west = west
+        self.north = north
+        self.pixel = pixel
+        self.grid = (north - pixel / 2, west + pixel / 2, pixel, pixel)
+        self.calls = 0
+
+    def sample(self, lat, long, method = "nearest"):
+        self.calls += 1
+        rows = (self.north - np.asarray(lat, dtype = np.float64)) / self.pixel
+        cols = (np.asarray(long, dtype = np.float64) - self.west) / self.pixel
+        interpolate = {"nearest": _nearest, "bilinear": _bilinear, "bicubic": _bicubic}[method]
+
+        return interpolate(self.values, rows, cols)
+
+    def close(self):
+        pass
+
+@pytest.mark.parametrize("method", ["nearest", "bilinear", "bicubic"])
+def test_cached_matches_source(tmp_path, method):
+    '''
+    Points are interpolated from cached pixels, so a cached run
+    gives the source's own values and a repeat never reaches it.
+    '''
+
+    dem = RasterDEM()
+    cached = CachedElevation(dem, ElevationCache(str(tmp_path / "elevation.db")))
+    rng = np.random.default_rng(0)
+    lat = 40.01 - rng.uniform(5, 195, size = 500) * dem.pixel
+    long = -105.01 + rng.uniform(5, 195, size = 500) * dem.pixel
+
+    expected = dem.sample(lat, long, method)
+    np.testing.assert_allclose(cached.sample(lat, long, method), expected, atol = 1e-9)
+
+    calls = dem.calls
+    np.testing.assert_allclose(cached.sample(lat, long, method), expected, atol = 1e-9)
+    assert dem.calls == calls
+    cached.close()
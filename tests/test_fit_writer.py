@@ -0,0 +1,49 @@
+import numpy as np
+import os
+
+import fitparse
+
+from synthetic import write_activity
+
+from gps_repair import Repairer
+from gps_repair.fit_reader import read_fit
+
+def test_two_file_round_trip(case, dem, tmp_path):
+    '''
+    Repairing a run split into a bad and a good file keeps the
+    other fields of the bad file's records and runs the distance
+    on through the route into the good file.
+    '''
+
+    directory, (start_bad, end_bad) = case
+    records = read_fit(fitparse.FitFile(os.path.join(directory, "activity.fit")))
+    stamps = records.epoch.astype(np.int64)
+    bad = str(tmp_path / "bad.fit")
+    good = str(tmp_path / "good.fit")
+    write_activity(bad, records.lat[start_bad:end_bad], records.long[start_bad:end_bad], stamps[start_bad:end_bad])
+    write_activity(good, records.lat[end_bad:], records.long[end_bad:], stamps[end_bad:])
+
+    output = str(tmp_path / "repaired.fit")
+    result = Repairer(dem, seed = 0).repair([bad, good], os.path.join(directory, "route.gpx"),
+                                            fit_output_path = output)
+
+    written = list(fitparse.FitFile(output).get_messages("record"))
+    assert len(written) == len(result.lat)
+    assert all(record.get_value("heart_rate") is not None for record in written)
+
+    distance = np.array([record.get_value("distance") for record in written])
+    assert distance[0] == 0
+    assert (np.diff(distance) >= 0).all()
+
+    #The good file's distance starts after the whole repaired route
+    route = len(result.lat) - (len(records) - end_bad)
+    assert distance[route] >= distance[route - 1]
+    assert distance[-1] > distance[route - 1] + (len(records) - end_bad - 1) * 3
+
+    #Both files' laps are kept, and the session covers the whole activity
+    laps = list(fitparse.FitFile(output).get_messages("lap"))
+    assert len(laps) == 2
+    assert abs(sum(lap.get_value("total_distance") for lap in laps) - distance[-1]) < 0.01
+    session, = fitparse.FitFile(output).get_messages("session")
+    assert abs(session.get_value("total_distance") - distance[-1]) < 0.01
+    assert session.get_value("total_elapsed_time") == stamps[-1] - stamps[start_bad]
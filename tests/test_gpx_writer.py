@@ -0,0 +1,24 @@
+import re
+
+import numpy as np
+
+from gps_repair.gpx_writer import write_gpx
+from gps_repair.track import Track
+
+def test_no_exponents_near_the_equator(tmp_path):
+    '''
+    GPX numbers are xsd:decimal, so tiny values near the equator
+    and the meridian must not come out in scientific notation.
+    '''
+
+    track = Track.from_columns([5e-05, -1e-07], [-5e-05, 0.0], [0.0, 1.0], elevation = [4e-05, np.nan])
+    path = str(tmp_path / "out.gpx")
+    write_gpx(path, track)
+
+    with open(path, "r") as f:
+        text = f.read()
+    numbers = re.findall(r'(?:lat|lon)="([^"]*)"', text) + re.findall(r"<ele>([^<]*)</ele>", text)
+
+    assert len(numbers) == 5
+    assert all(re.fullmatch(r"-?\d+\.\d+", number) for number in numbers)
+    assert 'lon="-0.00005000"' in text
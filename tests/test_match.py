@@ -0,0 +1,48 @@
+import numpy as np
+
+from gps_repair import Repairer
+from gps_repair.fit_reader import FitRecords
+from gps_repair.noise import Noise
+from gps_repair.projection import LocalProjection, planar_distances
+from gps_repair.track import Track
+
+SPEED = 3.0
+
+def straight_activity(n, start_bad, end_bad, off_route):
+    '''
+    A run due east at SPEED m/s, with the first and last
+    off_route records of the bad stretch 500 m north of it.
+    '''
+
+    projection = LocalProjection(40.0, -105.0)
+    east = np.arange(n) * SPEED
+    north = np.zeros(n)
+    north[start_bad:start_bad + off_route] = 500
+    north[end_bad - off_route:end_bad] = 500
+    lat, long = projection.from_enu(east, north)
+    track = Track.from_columns(lat, long, np.arange(n, dtype = np.float64), np.full(n, SPEED))
+
+    route_east = east[start_bad - 1:end_bad + 1:10]
+    route_lat, route_long = projection.from_enu(route_east, np.zeros(len(route_east)))
+
+    return FitRecords(track.data, np.empty(0), None, 0), route_lat, route_long, projection
+
+def test_unmatched_ends_keep_the_bad_segment_span(dem):
+    '''
+    Bad points off the route at both ends of the stretch still
+    leave the fixed segment covering all of it, with no jumps.
+    '''
+
+    start_bad, end_bad = 100, 900
+    records, route_lat, route_long, projection = straight_activity(1000, start_bad, end_bad, 200)
+    repairer = Repairer(dem, match_route = True, seed = 0)
+
+    segment = repairer.fix_segment(records, start_bad, end_bad, route_lat, route_long, Noise(0))
+
+    assert segment.time[0] == records.time[start_bad]
+    assert segment.time[-1] == records.time[end_bad - 1]
+    assert (np.diff(segment.time) >= 0).all()
+
+    east, north = projection.to_enu(segment.lat, segment.long)
+    step = planar_distances(east, north)
+    assert not ((np.diff(segment.time) == 0) & (step > 5)).any()
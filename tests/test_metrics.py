@@ -0,0 +1,27 @@
+import time
+
+from gps_repair.metrics import Metrics
+
+def test_nested_stages():
+    '''
+    An inner stage's time isn't counted twice, and resetting the
+    peak for it doesn't lose the outer stage's.
+    '''
+
+    metrics = Metrics(memory = True)
+    try:
+        with metrics.stage("fix"):
+            held = bytearray(2 << 20)
+            del held
+            with metrics.stage("pace_table"):
+                temporary = bytearray(4 << 20)
+                del temporary
+                time.sleep(0.1)
+    finally:
+        metrics.close()
+
+    stages = dict((stage["name"], stage) for stage in metrics.report()["stages"])
+    assert stages["pace_table"]["seconds"] >= 0.1
+    assert stages["fix"]["seconds"] < 0.05
+    assert stages["pace_table"]["peak_bytes"] >= 4 << 20
+    assert stages["fix"]["peak_bytes"] >= 4 << 20
@@ -0,0 +1,71 @@
+import numpy as np
+
+from synthetic import ORIGIN
+
+from gps_repair.pauses import detect_pauses
+from gps_repair.projection import LocalProjection
+
+def stream(vel, time = None):
+    '''
+    Records heading north at the given speeds, each held until
+    the next record, one a second unless time is given.
+    '''
+
+    vel = np.asarray(vel, dtype = np.float64)
+    time = np.arange(len(vel), dtype = np.float64) if time is None else np.asarray(time, dtype = np.float64)
+    north = np.concatenate(([0], np.cumsum(np.nan_to_num(vel[:-1]) * np.diff(time))))
+    lat, long = LocalProjection(*ORIGIN).from_enu(np.zeros(len(vel)), north)
+
+    return time, vel, lat, long
+
+def test_stop_is_a_pause():
+    vel = np.full(100, 3.0)
+    vel[40:60] = 0
+
+    moving, pauses = detect_pauses(*stream(vel))
+
+    assert pauses == [(40.0, 60.0)]
+    assert moving == 99 - 20
+
+def test_short_stop_is_moving():
+    vel = np.full(100, 3.0)
+    vel[40:42] = 0
+
+    moving, pauses = detect_pauses(*stream(vel))
+
+    assert pauses == []
+    assert moving == 99
+
+def test_gps_speed_without_watch_speed():
+    '''
+    Records without a watch speed fall back to the GPS.
+    '''
+
+    time, vel, lat, long = stream(np.where(np.arange(100) // 40 == 1, 0.0, 3.0))
+
+    _, pauses = detect_pauses(time, np.full(100, np.nan), lat, long)
+
+    assert pauses == [(40.0, 80.0)]
+
+def test_auto_pause_gap():
+    '''
+    A long gap between records counts as a pause only when no
+    ground was covered across it, whatever the watch's last speed.
+    '''
+
+    time = np.concatenate((np.arange(50), np.arange(50) + 100)).astype(np.float64)
+    vel = np.full(100, 3.0)
+
+    #Positions that don't move across the gap
+    _, _, lat, long = stream(np.where(np.arange(100) == 49, 0.0, 3.0), time)
+    _, stopped = detect_pauses(time, vel, lat, long)
+    _, moved = detect_pauses(*stream(vel, time))
+
+    assert stopped == [(49.0, 100.0)]
+    assert moved == []
+
+def test_thresholds_depend_on_sport():
+    walk = stream(np.full(100, 0.8))
+
+    assert detect_pauses(*walk, sport = "running")[1] == [(0.0, 99.0)]
+    assert detect_pauses(*walk, sport = "walking")[1] == []
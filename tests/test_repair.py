@@ -0,0 +1,78 @@
+import numpy as np
+import os
+
+from helpers import SlopeDEM
+from synthetic import SPEED, START, write_activity, write_route
+
+from gps_repair import Repairer
+from gps_repair.projection import LocalProjection
+
+class CountingDEM(SlopeDEM):
+    def __init__(self):
+        self.points = 0
+
+    def sample(self, lat, long, method = "bilinear"):
+        self.points += len(lat)
+
+        return SlopeDEM.sample(self, lat, long, method)
+
+def test_each_point_sampled_once(case):
+    '''
+    The good records are sampled once for both the pace table
+    and the output, and only fixed points are sampled again.
+    '''
+
+    directory, interval = case
+    dem = CountingDEM()
+    result = Repairer(dem, seed = 0).repair(os.path.join(directory, "activity.fit"),
+                                            os.path.join(directory, "route.gpx"), interval)
+
+    good = len(result.good[0])
+    fixed = len(result.lat) - good
+    stages = dict((stage["name"], stage) for stage in result.metrics.report()["stages"])
+    assert stages["elevation"]["points"] == len(result.lat)
+
+    #Besides every output point, only the route's vertices for its grades
+    assert dem.points < len(result.lat) + 2 * fixed
+
+def test_no_pace_table_when_matched(tmp_path):
+    '''
+    When the bad points snap onto the route the pace model isn't
+    needed, so neither is any elevation beyond the output's.
+    '''
+
+    n, start_bad, end_bad = 600, 200, 400
+    rng = np.random.default_rng(0)
+    projection = LocalProjection(40.0, -105.0)
+    east = np.arange(n) * SPEED
+    north = rng.normal(0, 2, size = n)
+    north[start_bad:end_bad] += rng.normal(0, 10, size = end_bad - start_bad)
+    lat, long = projection.from_enu(east, north)
+    write_activity(str(tmp_path / "activity.fit"), lat, long, START + np.arange(n))
+    route_lat, route_long = projection.from_enu(east[start_bad:end_bad:20], np.zeros(10))
+    write_route(str(tmp_path / "route.gpx"), route_lat, route_long)
+
+    dem = CountingDEM()
+    result = Repairer(dem, seed = 0, match_route = True).repair(str(tmp_path / "activity.fit"),
+                                                                str(tmp_path / "route.gpx"), (start_bad, end_bad))
+
+    assert "pace_table" not in [stage["name"] for stage in result.metrics.report()["stages"]]
+    assert dem.points == len(result.lat)
+
+def test_same_seed_same_output(case, dem, tmp_path):
+    '''
+    Repairs with the same seed write identical files, and a
+    different seed gives different noise.
+    '''
+
+    directory, interval = case
+    outputs = []
+    for i, seed in enumerate((1, 1, 2)):
+        output = str(tmp_path / "{}.gpx".format(i))
+        Repairer(dem, seed = seed).repair(os.path.join(directory, "activity.fit"),
+                                          os.path.join(directory, "route.gpx"), interval, output)
+        with open(output, "rb") as f:
+            outputs.append(f.read())
+
+    assert outputs[0] == outputs[1]
+    assert outputs[0] != outputs[2]
@@ -0,0 +1,63 @@
+import numpy as np
+
+from synthetic import ORIGIN
+
+from gps_repair.distance import segment_distances
+from gps_repair.projection import LocalProjection
+from gps_repair.route import condition_route, densify, remove_duplicates, simplify
+
+def corner(step = 10.0):
+    '''
+    An L of 100 m legs north then east, a point every step
+    metres, with the corner at index 100 / step.
+    '''
+
+    leg = np.arange(0, 100 + step, step)
+    east = np.concatenate((np.zeros(len(leg) - 1), leg))
+    north = np.concatenate((leg[:-1], np.full(len(leg), 100.0)))
+
+    return LocalProjection(*ORIGIN).from_enu(east, north)
+
+def test_remove_duplicates():
+    lat = [40.0, 40.0, 40.1, 40.1, 40.0]
+    long = [-105.0, -105.0, -105.0, -105.1, -105.1]
+
+    lat, long = remove_duplicates(lat, long)
+
+    assert lat.tolist() == [40.0, 40.1, 40.1, 40.0]
+    assert long.tolist() == [-105.0, -105.0, -105.1, -105.1]
+
+def test_simplify_keeps_corners():
+    '''
+    Points along a straight leg go, the ends and the corner stay.
+    '''
+
+    lat, long = corner()
+
+    simple_lat, simple_long = simplify(lat, long, 1.0)
+
+    assert simple_lat.tolist() == [lat[0], lat[10], lat[-1]]
+    assert simple_long.tolist() == [long[0], long[10], long[-1]]
+
+def test_densify_spacing():
+    '''
+    Every piece is at most spacing long and the vertices stay put.
+    '''
+
+    lat, long = simplify(*corner(), 1.0)
+
+    dense_lat, dense_long = densify(lat, long, 3.0)
+
+    assert segment_distances(dense_lat, dense_long).max() <= 3.0
+    assert np.isin(lat, dense_lat).all() and np.isin(long, dense_long).all()
+    assert abs(segment_distances(dense_lat, dense_long).sum() - segment_distances(lat, long).sum()) < 0.01
+
+def test_condition_route():
+    lat, long = corner()
+    lat = np.repeat(lat, 2)
+    long = np.repeat(long, 2)
+
+    conditioned_lat, _ = condition_route(lat, long, 1.0, 6.0)
+
+    #Two 100 m legs in 17 pieces each
+    assert len(conditioned_lat) == 35